@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
-from fingerprint.admin import UserFingerprintAdmin
+from fingerprint.admin import LargeTableAdminMixin, RequestFingerprintAdmin, UserFingerprintAdmin
+from fingerprint.models import RequestFingerprint
 
 admin.site.unregister(get_user_model())
+admin.site.unregister(RequestFingerprint)
 
 
 @admin.register(get_user_model())
@@ -18,3 +20,8 @@ class UserAdmin(UserFingerprintAdmin):
         "num_request_fingerprints",
         "request_fingerprints",
     )
+
+
+@admin.register(RequestFingerprint)
+class LargeRequestFingerprintAdmin(LargeTableAdminMixin, RequestFingerprintAdmin):
+    list_per_page = 20
@@ -0,0 +1,168 @@
+"""
+Benchmarks of fingerprinting hot paths, run against the demo project by `manage.py benchmark`.
+
+Each benchmark reports wall time of its runs and the number of database queries of a single run,
+so that both slower code and extra queries show up when comparing results of two versions.
+"""
+
+from __future__ import annotations
+
+import statistics
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import asdict, dataclass, field
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.template import Context, Template
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from fingerprint.models import RequestFingerprint, Url, UrlHitCount, UserSession
+
+SEED_SESSIONS = 20
+HITS_PER_URL = 3
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: dict = field(default_factory=dict)
+    runs: int = 0
+    queries: int = 0
+    min_ms: float = 0.0
+    median_ms: float = 0.0
+    mean_ms: float = 0.0
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def measure(name: str, fn: Callable[[], object], repeat: int, **params) -> BenchmarkResult:
+    """Run `fn` `repeat` times; queries are counted during the first run only, since later ones may hit caches."""
+    result = BenchmarkResult(name=name, params=params)
+    timings = []
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            timings.append(timed(fn))
+        result.queries = len(queries)
+        timings.extend(timed(fn) for _ in range(repeat - 1))
+    except Exception as exc:
+        # e.g. a query not supported by the database backend
+        result.error = repr(exc)
+        return result
+
+    result.runs = len(timings)
+    result.min_ms = min(timings)
+    result.median_ms = statistics.median(timings)
+    result.mean_ms = statistics.mean(timings)
+    return result
+
+
+def timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def seed(num_urls: int) -> list[str]:
+    """Create `num_urls` urls, each visited by `HITS_PER_URL` sessions, and return the urls."""
+    user = get_user_model().objects.create(username="benchmark-seed")
+    sessions = UserSession.objects.bulk_create(
+        [UserSession(session_key=f"benchmark-{i}", user=user if i == 0 else None) for i in range(SEED_SESSIONS)]
+    )
+
+    values = [f"http://testserver/page/{i}" for i in range(num_urls)]
+    Url.objects.bulk_create([Url(value=value, value_hash=Url.hash_value(value)) for value in values], batch_size=1000)
+    url_ids = Url.objects.get_ids(values)
+
+    RequestFingerprint.objects.bulk_create(
+        [
+            RequestFingerprint(
+                user_session=sessions[(i + hit) % len(sessions)],
+                url_id=url_ids[value],
+                ip="127.0.0.1",
+                user_agent=f"agent {hit}",
+            )
+            for i, value in enumerate(values)
+            for hit in range(HITS_PER_URL)
+        ],
+        batch_size=1000,
+    )
+    # bulk_create doesn't maintain hit counters
+    UrlHitCount.objects.rebuild()
+    return values
+
+
+def request_benchmarks(repeat: int) -> Iterator[BenchmarkResult]:
+    client = Client()
+    urls = count()
+
+    def get(path: str) -> Callable[[], object]:
+        # every run visits a new url, so that it is not debounced
+        return lambda: client.get(f"{path}?n={next(urls)}", HTTP_USER_AGENT="benchmark")
+
+    baseline = measure("request.plain", get("/plain-test"), repeat)
+    yield baseline
+
+    for name, path in (
+        ("request.fingerprint", "/request-test"),
+        ("request.remember_user_session", "/session-test"),
+        ("request.fingerprint.async", "/async-request-test"),
+    ):
+        result = measure(name, get(path), repeat)
+        result.params["overhead_ms"] = result.median_ms - baseline.median_ms
+        yield result
+
+    client.force_login(get_user_model().objects.create(username="benchmark-client"))
+    yield measure("request.remember_user_session.authenticated", get("/session-test"), repeat)
+
+    visitor_ids = count()
+    yield measure(
+        "request.fingerprint_view.post",
+        lambda: client.post("/_/", {"id": f"visitor-{next(visitor_ids)}"}, HTTP_REFERER="http://testserver/"),
+        repeat,
+    )
+
+
+def hit_count_benchmarks(urls: list[str], sizes: Iterable[int], repeat: int) -> Iterator[BenchmarkResult]:
+    template = Template("{% load hit_count %}{% for url in urls %}{% hit_count url %} {% endfor %}")
+    batched_template = Template(
+        "{% load hit_count %}{% hit_counts %}{% for url in urls %}{% hit_count url %} {% endfor %}{% endhit_counts %}"
+    )
+    for size in sizes:
+        subset = urls[:size]
+        yield measure("get_count_for_urls", lambda: RequestFingerprint.get_count_for_urls(subset), repeat, urls=size)
+        yield measure("hit_count", lambda: template.render(Context({"urls": subset})), repeat, urls=size)
+        yield measure("hit_counts", lambda: batched_template.render(Context({"urls": subset})), repeat, urls=size)
+
+
+def admin_benchmarks(repeat: int) -> Iterator[BenchmarkResult]:
+    client = Client()
+    client.force_login(
+        get_user_model().objects.create_superuser(username="benchmark-admin", email="admin@example.com", password="-")
+    )
+
+    def get(path: str) -> Callable[[], object]:
+        def fn():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+
+        return fn
+
+    for model in ("usersession", "requestfingerprint", "browserfingerprint", "userfingerprint"):
+        yield measure(f"admin.{model}.changelist", get(f"/admin/fingerprint/{model}/"), repeat)
+
+
+def run_benchmarks(sizes: Iterable[int] = (1, 100, 10_000), repeat: int = 10) -> list[BenchmarkResult]:
+    """Seed the current database with enough urls for the largest of `sizes`, and run all benchmarks."""
+    sizes = sorted(sizes)
+    urls = seed(sizes[-1])
+    return [
+        *request_benchmarks(repeat),
+        *hit_count_benchmarks(urls, sizes, repeat),
+        *admin_benchmarks(repeat),
+    ]
@@ -0,0 +1,49 @@
+import json
+import platform
+import sys
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.timezone import now
+
+from demo.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark fingerprinting hot paths in a throwaway test database and print results as JSON. "
+        "Use POSTGRES_* environment variables to run against postgres instead of sqlite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1, 100, 10_000],
+            help="numbers of urls to count hits for",
+        )
+        parser.add_argument("--repeat", type=int, default=10, help="number of runs of each benchmark")
+        parser.add_argument("--output", help="write results to this file instead of stdout")
+
+    def handle(self, *args, sizes, repeat, output, verbosity, **options):
+        old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+        try:
+            results = run_benchmarks(sizes=sizes, repeat=repeat)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+        report = {
+            "created": now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "results": [result.as_dict() for result in results],
+        }
+        if output:
+            with open(output, "w") as file:
+                json.dump(report, file, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write("\n")
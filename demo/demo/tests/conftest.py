@@ -3,6 +3,8 @@ from cacheops import invalidate_all
 from django.contrib.auth import get_user_model
 from django.test import Client
 
+from fingerprint.cache import get_last_seen_cache
+
 
 @pytest.fixture
 def user(db):
@@ -26,3 +28,6 @@ def nocache(settings) -> None:
 def clear_cache():
     yield
     invalidate_all()
+    # primary keys are reused by tests, so objects must not look recently seen in the next test
+    if (last_seen_cache := get_last_seen_cache()) is not None:
+        last_seen_cache.clear()
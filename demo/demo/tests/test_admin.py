@@ -0,0 +1,135 @@
+import pytest
+from django.contrib.admin import site
+from django.test import Client
+
+from fingerprint.admin import MAX_ITEMS, parse_network
+from fingerprint.models import RequestFingerprint
+
+
+@pytest.fixture
+def admin_client(db, django_user_model) -> Client:
+    client = Client()
+    client.force_login(django_user_model.objects.create_superuser(username="admin", email="admin@example.com"))
+    return client
+
+
+@pytest.fixture
+def history(user, user_client, settings):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+    for i in range(MAX_ITEMS + 5):
+        user_client.get(f"/request-test?page={i}", HTTP_USER_AGENT=f"agent {i}")
+        user_client.get(f"/request-test?page={i}&again=1", HTTP_USER_AGENT="agent 0")
+        user_client.post("/_/", {"id": f"visitor {i}"}, HTTP_REFERER="http://testserver/")
+    user_client.logout()
+
+
+@pytest.mark.parametrize("model", ["usersession", "userfingerprint"])
+def test__admin__changelist__latest_devices(history, admin_client, model):
+    response = admin_client.get(f"/admin/fingerprint/{model}/")
+    assert response.status_code == 200
+
+    content = response.content.decode()
+    # agent 0 is the latest device, followed by agents 14..6
+    shown = {f"agent {i}..." for i in (0, *range(6, MAX_ITEMS + 5))}
+    hidden = {f"agent {i}..." for i in range(1, 6)}
+    assert all(agent in content for agent in shown)
+    assert not any(agent in content for agent in hidden)
+
+
+def test__admin__changelist__num_queries(history, admin_client, django_assert_max_num_queries):
+    for model in ("usersession", "userfingerprint"):
+        with django_assert_max_num_queries(15):
+            admin_client.get(f"/admin/fingerprint/{model}/")
+
+
+def test__admin__keyset_pagination(db, admin_client):
+    for i in range(45):
+        Client().get(f"/request-test?page={i}")
+    expected = list(RequestFingerprint.objects.order_by("-created", "-id").values_list("id", flat=True))
+
+    ids = []
+    url = "/admin/fingerprint/requestfingerprint/"
+    while url:
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        ids.extend(obj.id for obj in response.context["cl"].result_list)
+        assert "45 request fingerprints" in response.content.decode()
+        url = response.context["cl"].next_page_url
+        if url:
+            url = "/admin/fingerprint/requestfingerprint/" + url
+
+    assert ids == expected
+
+
+def test__admin__keyset_pagination__invalid_cursor(db, admin_client):
+    response = admin_client.get("/admin/fingerprint/requestfingerprint/?cursor=invalid")
+    assert response.status_code == 302
+    assert response.url.endswith("?e=1")
+
+
+def test__admin__keyset_pagination__sorted(db, admin_client):
+    response = admin_client.get("/admin/fingerprint/requestfingerprint/?o=4")
+    assert response.status_code == 200
+    assert not response.context["cl"].keyset_paginated
+
+
+@pytest.mark.parametrize(
+    "term, expected",
+    [
+        ("10.1.2.3", "10.1.2.3/32"),
+        ("10.1.0.0/16", "10.1.0.0/16"),
+        ("2001:db8::/32", "2001:db8::/32"),
+        ("10.1.", None),
+        ("10.1", None),
+        ("10.300.", None),
+        ("chrome", None),
+        ("42", None),
+    ],
+)
+def test__admin__parse_network(term, expected):
+    assert parse_network(term) == expected
+
+
+@pytest.fixture
+def searched(db, settings):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+    for ip, agent in (("10.1.2.3", "Firefox"), ("10.2.0.1", "Chrome"), ("192.168.0.1", "Chrome mobile")):
+        Client(REMOTE_ADDR=ip).get(f"/request-test?ip={ip}", HTTP_USER_AGENT=agent)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("10.0.0.0/8", {"10.1.2.3", "10.2.0.1"}),
+        ("10.1.", {"10.1.2.3"}),
+        ("2.0", {"10.2.0.1"}),
+        ("192.168.0.1", {"192.168.0.1"}),
+        ("chrome", {"10.2.0.1", "192.168.0.1"}),
+        ("chrome 10.", {"10.2.0.1"}),
+        ("safari", set()),
+        ("admin", set()),
+    ],
+)
+def test__admin__search(searched, admin_client, query, expected):
+    response = admin_client.get("/admin/fingerprint/requestfingerprint/", {"q": query})
+    assert response.status_code == 200
+    assert {obj.ip for obj in response.context["cl"].result_list} == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("http://testserver/request-test?ip=10.1.2.3", {"10.1.2.3"}),
+        ("request-test", set()),
+        ("chrome http://testserver/request-test?ip=10.2.0.1", {"10.2.0.1"}),
+        ("chrome http://testserver/request-test?ip=10.1.2.3", set()),
+        ("10.1.", {"10.1.2.3"}),
+    ],
+)
+def test__admin__search__prefixed_fields(searched, admin_client, monkeypatch, query, expected):
+    model_admin = site._registry[RequestFingerprint]
+    monkeypatch.setattr(model_admin, "search_fields", (*model_admin.search_fields, "=url__value"))
+
+    response = admin_client.get("/admin/fingerprint/requestfingerprint/", {"q": query})
+    assert response.status_code == 200
+    assert {obj.ip for obj in response.context["cl"].result_list} == expected
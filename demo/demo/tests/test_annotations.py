@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db.models import Value
+from django.db.models.functions import Concat
+from freezegun import freeze_time
+
+from fingerprint.functions import hash_value
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, Url, UrlHitRollup, UserSession
+
+User = get_user_model()
+DAY1 = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+DAY2 = DAY1 + timedelta(days=1)
+USER_URL = Concat(Value("https://example.com/users/"), "username")
+
+
+@pytest.fixture
+def hits(db):
+    sessions = [UserSession.objects.create(session_key=f"session-{i}") for i in range(3)]
+    for username, num_sessions, created in (("alice", 1, DAY1), ("bob", 3, DAY2), ("carol", 0, DAY2)):
+        User.objects.create(username=username)
+        url_id = Url.objects.get_or_create_id(f"https://example.com/users/{username}")
+        with freeze_time(created):
+            for session in sessions[:num_sessions]:
+                RequestFingerprint.objects.create(user_session=session, url_id=url_id)
+                BrowserFingerprint.objects.create(user_session=session, url_id=url_id, visitor_id="visitor")
+    User.objects.create(username="dave")  # without url
+
+
+def test__hash_value__matches_database(hits):
+    url = Url.objects.get(value="https://example.com/users/alice")
+    assert Url.objects.filter(**Url.get_expression_lookup(Value(url.value))).get() == url
+    assert url.value_hash == hash_value(url.value)
+
+
+@pytest.mark.parametrize("model", [RequestFingerprint, BrowserFingerprint])
+def test__annotate_hit_counts(hits, model):
+    users = model.annotate_hit_counts(User.objects.order_by("username"), USER_URL)
+    assert list(users.values_list("username", "hit_count")) == [("alice", 1), ("bob", 3), ("carol", 0), ("dave", 0)]
+
+
+@pytest.mark.parametrize("model", [RequestFingerprint, BrowserFingerprint])
+def test__annotate_hit_counts__order_and_filter(hits, model):
+    users = model.annotate_hit_counts(User.objects.all(), USER_URL, name="popularity")
+    assert list(users.filter(popularity__gt=0).order_by("-popularity").values_list("username", flat=True)) == [
+        "bob",
+        "alice",
+    ]
+
+
+@pytest.mark.parametrize("model", [RequestFingerprint, BrowserFingerprint])
+def test__annotate_hit_counts__window(hits, model):
+    with freeze_time(DAY2):
+        UrlHitRollup.objects.build()
+    users = model.annotate_hit_counts(User.objects.order_by("username"), USER_URL, since=DAY2)
+    assert list(users.values_list("hit_count", flat=True)) == [0, 3, 0, 0]
+
+
+def test__annotate_hit_counts__num_queries(hits, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        list(RequestFingerprint.annotate_hit_counts(User.objects.all(), USER_URL))
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.utils.timezone import now
+
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, UserSession
+
+
+def test__async_request__anonymous(client, db):
+    response = client.get("/async-request-test?utm_source=test", HTTP_USER_AGENT="agent")
+    assert response.status_code == 200
+
+    user_session = UserSession.objects.get()
+    assert not user_session.user
+    assert user_session.utm_source == "test"
+
+    fingerprint = RequestFingerprint.objects.get()
+    assert fingerprint.ip == "127.0.0.1"
+    assert fingerprint.user_agent == "agent"
+    assert fingerprint.user_session == user_session
+    assert fingerprint.url.value == "http://testserver/async-request-test?utm_source=test"
+
+
+def test__async_request__debounce(client, db, settings):
+    settings.FINGERPRINT_DEBOUNCE_PERIOD = timedelta(minutes=10)
+
+    assert client.get("/async-request-test").status_code == 200
+    assert client.get("/async-request-test").status_code == 200
+    assert RequestFingerprint.objects.count() == 1
+
+
+def test__async_request__user_session__user_capture(user, user_client, db):
+    UserSession.objects.all().delete()
+
+    response = user_client.get("/async-session-test")
+    assert response.status_code == 200
+
+    assert UserSession.objects.get().user == user
+
+
+def test__async_request__user_session__user_not_capture(client, db):
+    response = client.get("/async-session-test")
+    assert response.status_code == 200
+
+    assert not UserSession.objects.exists()
+
+
+def test__async_builtin_view__logged_in(user, user_client, db):
+    UserSession.objects.all().delete()
+
+    response = user_client.get("/_async/")
+    assert response.status_code == 200
+    assert RequestFingerprint.objects.count() == 1
+    assert UserSession.objects.get().user == user
+
+
+def test__async_browser__post_request(client, db):
+    response = client.post("/_async/", {"id": "12345"}, HTTP_REFERER="http://localhost/somepath")
+    assert response.status_code == 200
+
+    assert not RequestFingerprint.objects.exists()
+    fingerprint = BrowserFingerprint.objects.get()
+    assert fingerprint.visitor_id == "12345"
+    assert now() - timedelta(seconds=5) <= fingerprint.created < now()
+    assert fingerprint.url.value == "http://localhost/somepath"
+
+
+def test__async_browser__post_request__no_id(client, db):
+    response = client.post("/_async/", {}, HTTP_REFERER="http://localhost/somepath")
+    assert response.status_code == 400
+    assert not BrowserFingerprint.objects.exists()
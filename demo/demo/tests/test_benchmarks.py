@@ -0,0 +1,18 @@
+from demo.benchmarks import run_benchmarks
+
+
+def test__run_benchmarks(db):
+    results = run_benchmarks(sizes=(1, 2), repeat=2)
+
+    assert {(result.name, result.params.get("urls")) for result in results} >= {
+        ("request.fingerprint", None),
+        ("request.fingerprint_view.post", None),
+        ("get_count_for_urls", 1),
+        ("get_count_for_urls", 2),
+        ("hit_count", 2),
+    }
+    for result in results:
+        assert result.error is None
+        assert result.runs == 2
+        assert result.median_ms > 0
+    assert next(result for result in results if result.name == "hit_count" and result.params["urls"] == 2).queries == 4
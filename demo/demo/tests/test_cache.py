@@ -0,0 +1,194 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from freezegun import freeze_time
+
+from fingerprint.cache import LRUCache, get_hit_count_cache, get_url_id_cache, get_user_session_id_cache
+from fingerprint.models import RequestFingerprint, Url, UserSession
+
+
+def test__lru_cache__eviction():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert lru.info() == (3, 2, 2, 2)
+
+
+def test__lru_cache__ttl():
+    with freeze_time() as frozen:
+        lru = LRUCache(maxsize=10, ttl=timedelta(seconds=10))
+        lru.set("a", 1)
+        frozen.tick(timedelta(seconds=9))
+        assert lru.get("a") == 1
+        frozen.tick(timedelta(seconds=2))
+        assert lru.get("a") is None
+        assert len(lru) == 0
+
+
+@pytest.fixture
+def url_cache(settings):
+    settings.FINGERPRINT_URL_CACHE_SIZE = 100
+    return get_url_id_cache()
+
+
+def test__url_cache__get_or_create_id(db, url_cache, django_assert_num_queries):
+    id_ = Url.objects.get_or_create_id("http://testserver/")
+    assert url_cache.info().misses == 1
+
+    with django_assert_num_queries(0):
+        assert Url.objects.get_or_create_id("http://testserver/") == id_
+    assert url_cache.info().hits == 1
+
+
+def test__url_cache__request(db, client, url_cache):
+    client.get("/request-test")
+    with CaptureQueriesContext(connection) as context:
+        client.get("/request-test")
+
+    assert not [query for query in context.captured_queries if '"fingerprint_url"' in query["sql"]]
+    assert url_cache.info().hits == 1
+
+
+def test__url_cache__get_count_for_urls(db, client, url_cache, django_assert_num_queries):
+    client.get("/request-test")
+    url = "http://testserver/request-test"
+
+    with django_assert_num_queries(1):
+        assert RequestFingerprint.get_count_for_urls([url]) == {url: 1}
+
+    # unknown urls are not cached, so they are looked up in the database every time
+    with django_assert_num_queries(2):
+        assert RequestFingerprint.get_count_for_urls([url, "http://testserver/unknown"]) == {url: 1}
+
+
+def test__url_cache__shared(db, settings, django_assert_num_queries):
+    settings.FINGERPRINT_URL_CACHE_ALIAS = "default"
+    id_ = Url.objects.get_or_create_id("http://testserver/")
+
+    with django_assert_num_queries(0):
+        assert Url.objects.get_or_create_id("http://testserver/") == id_
+
+    cache.clear()
+
+
+def test__url_cache__evict_on_delete(db, url_cache):
+    url = Url.objects.get(id=Url.objects.get_or_create_id("http://testserver/"))
+    url.delete()
+
+    assert url_cache.get("http://testserver/") is None
+    assert Url.objects.get_or_create_id("http://testserver/") != url.id
+
+
+@pytest.fixture
+def user_session_cache(settings):
+    settings.FINGERPRINT_USER_SESSION_CACHE_SIZE = 100
+    return get_user_session_id_cache()
+
+
+def test__user_session_cache__request(db, client, user_session_cache):
+    client.get("/request-test")
+    with CaptureQueriesContext(connection) as context:
+        client.get("/request-test?param=1")
+
+    # the session and its (lack of) user are resolved from cache
+    assert not [
+        query for query in context.captured_queries if query["sql"].startswith('SELECT "fingerprint_usersession"')
+    ]
+    assert RequestFingerprint.objects.count() == 2
+    assert UserSession.objects.count() == 1
+
+
+def test__user_session_cache__invalidation(db, client, user, user_session_cache):
+    client.get("/request-test")
+    session_key = client.session.session_key
+    assert user_session_cache.get(session_key) is not None
+
+    UserSession.objects.update_or_create(session_key=session_key, defaults=dict(user=user))
+    assert user_session_cache.get(session_key) is None
+
+    UserSession.objects.get_or_create_id(session_key)
+    UserSession.objects.filter(session_key=session_key).get().delete()
+    assert user_session_cache.get(session_key) is None
+
+
+@pytest.fixture
+def hit_count_cache(settings, url_cache):
+    settings.FINGERPRINT_HIT_COUNT_CACHE_SIZE = 100
+    return get_hit_count_cache()
+
+
+def test__hit_count_cache__get_count_for_urls(db, client, hit_count_cache, django_assert_num_queries):
+    urls = ["http://testserver/request-test", "http://testserver/request-test?param=1"]
+    client.get("/request-test")
+    client.get("/request-test?param=1")
+    RequestFingerprint.get_count_for_urls(urls)
+
+    with django_assert_num_queries(0):
+        assert RequestFingerprint.get_count_for_urls(urls) == {urls[0]: 1, urls[1]: 1}
+
+
+def test__hit_count_cache__zero_hits(db, hit_count_cache, django_assert_num_queries):
+    url = Url.objects.get_or_create_id("http://testserver/never-visited")
+    assert RequestFingerprint.get_count_for_urls(["http://testserver/never-visited"]) == {}
+    assert hit_count_cache.get(("fingerprint.requestfingerprint:exact", url)) == 0
+
+    with django_assert_num_queries(0):
+        assert RequestFingerprint.get_count_for_urls(["http://testserver/never-visited"]) == {}
+
+
+def test__hit_count_cache__invalidation(db, client, hit_count_cache, django_capture_on_commit_callbacks):
+    url = "http://testserver/request-test"
+    client.get("/request-test")
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 1}
+
+    client.get("/request-test")  # not a new hit
+    assert len(hit_count_cache) == 1
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        Client().get("/request-test")
+    # evicted only once the new hit is committed
+    assert len(hit_count_cache) == 1
+    for callback in callbacks:
+        callback()
+    assert len(hit_count_cache) == 0
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 2}
+
+
+def test__hit_count_cache__no_invalidation(db, client, settings, hit_count_cache):
+    settings.FINGERPRINT_HIT_COUNT_CACHE_INVALIDATE = False
+    hit_count_cache = get_hit_count_cache()  # rebuilt after settings change
+    url = "http://testserver/request-test"
+    client.get("/request-test")
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 1}
+
+    Client().get("/request-test")
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 1}
+
+    hit_count_cache.clear()
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 2}
+
+
+def test__hit_count_cache__shared(db, client, settings, django_assert_num_queries, django_capture_on_commit_callbacks):
+    settings.FINGERPRINT_HIT_COUNT_CACHE_ALIAS = "default"
+    settings.FINGERPRINT_URL_CACHE_SIZE = 100
+    cache.clear()
+    url = "http://testserver/request-test"
+    client.get("/request-test")
+    RequestFingerprint.get_count_for_urls([url])
+
+    with django_assert_num_queries(0):
+        assert RequestFingerprint.get_count_for_urls([url]) == {url: 1}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Client().get("/request-test")
+    assert RequestFingerprint.get_count_for_urls([url]) == {url: 2}
+    cache.clear()
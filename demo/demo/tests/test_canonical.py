@@ -0,0 +1,70 @@
+from collections import Counter
+
+import pytest
+from django.test import Client
+
+from fingerprint.canonical import UrlCanonicalizer, canonicalize_url, get_url_canonicalizer
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, Url
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("http://example.com", "https://example.com/"),
+        ("https://WWW.Example.com/", "https://example.com/"),
+        ("http://example.com:80/path/", "https://example.com/path"),
+        ("https://example.com:8443/path", "https://example.com:8443/path"),
+        ("https://example.com/?b=2&a=1&a=0", "https://example.com/?a=0&a=1&b=2"),
+        ("https://example.com/?utm_source=x&fbclid=y&id=1#top", "https://example.com/?id=1"),
+        ("https://[::1]:443/", "https://[::1]/"),
+        ("", ""),
+        ("?", "?"),
+        ("ftp://example.com/", "ftp://example.com/"),
+        ("http://[abc/x", "http://[abc/x"),
+        ("http://example.com:99999/", "http://example.com:99999/"),
+    ],
+)
+def test__canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+def test__url_canonicalizer__options():
+    canonicalizer = UrlCanonicalizer(scheme=None, strip_www=False, strip_trailing_slash=False, sort_params=False)
+    assert canonicalizer("http://www.example.com/path/?b=1&a=2") == "http://www.example.com/path/?b=1&a=2"
+
+
+@pytest.fixture
+def canonical_urls(settings):
+    settings.FINGERPRINT_URL_CANONICALIZER = "fingerprint.canonical.canonicalize_url"
+
+
+def test__canonical_urls__request(db, canonical_urls):
+    Client().get("/request-test?utm_source=newsletter&b=2&a=1")
+    Client().get("/request-test?a=1&b=2&fbclid=123")
+    Client().get("/async-request-test?utm_medium=email")
+
+    assert set(Url.objects.filter(requestfingerprints__isnull=False).values_list("value", flat=True)) == {
+        "https://testserver/request-test?a=1&b=2",
+        "https://testserver/async-request-test",
+    }
+    assert RequestFingerprint.get_count_for_urls(["http://testserver/request-test?b=2&a=1"]) == Counter(
+        {"http://testserver/request-test?b=2&a=1": 2}
+    )
+
+
+def test__canonical_urls__memoized(db, client, canonical_urls):
+    client.get("/request-test?utm_source=newsletter")
+    client.get("/request-test?utm_source=newsletter")
+    assert get_url_canonicalizer().cache_info().hits == 1
+
+
+def test__canonical_urls__browser_fingerprint(db, client, canonical_urls):
+    client.post("/_/", {"id": "visitor"}, HTTP_REFERER="http://testserver/page/?utm_campaign=x")
+    assert BrowserFingerprint.objects.get().url.value == "https://testserver/page"
+
+
+@pytest.mark.parametrize("referer", ["http://[abc/x", "http://testserver:99999/page"])
+@pytest.mark.parametrize("view", ["/_/", "/_async/"])
+def test__canonical_urls__malformed_referer(db, client, canonical_urls, view, referer):
+    assert client.post(view, {"id": "visitor"}, HTTP_REFERER=referer).status_code == 200
+    assert BrowserFingerprint.objects.get().url.value == referer
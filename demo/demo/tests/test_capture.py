@@ -0,0 +1,218 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.utils.timezone import now
+from freezegun import freeze_time
+
+from fingerprint.capture import buffer
+from fingerprint.models import HeaderValue, RequestFingerprint, Url, UrlHitCount, UserSession
+from fingerprint.views import fingerprint
+
+
+@pytest.fixture
+def buffered(settings):
+    settings.FINGERPRINT_BUFFERED = True
+    settings.FINGERPRINT_BUFFER_SIZE = 3
+    settings.FINGERPRINT_BUFFER_FLUSH_INTERVAL = timedelta(hours=1)
+    buffer.flush()
+    yield
+    buffer.flush()
+
+
+def test__buffered__flush_on_size(db, client, buffered):
+    client.get("/request-test")
+    client.get("/request-test?param=1")
+    assert len(buffer) == 2
+    assert not RequestFingerprint.objects.exists()
+    assert not UserSession.objects.exists()
+
+    client.get("/request-test?param=2")
+    assert len(buffer) == 0
+    assert RequestFingerprint.objects.count() == 3
+    assert UserSession.objects.count() == 1
+    assert set(Url.objects.filter(requestfingerprints__isnull=False).values_list("value", flat=True)) == {
+        "http://testserver/request-test",
+        "http://testserver/request-test?param=1",
+        "http://testserver/request-test?param=2",
+    }
+
+
+def test__buffered__debounce(db, client, buffered):
+    client.get("/request-test")
+    client.get("/request-test")
+    assert buffer.flush() == 1
+
+    client.get("/request-test")
+    assert buffer.flush() == 0
+    assert RequestFingerprint.objects.count() == 1
+
+
+def test__buffered__session_defaults(db, client, buffered):
+    client.get("/request-test?utm_source=first", HTTP_REFERER="http://localhost/somepath", HTTP_USER_AGENT="agent")
+    buffer.flush()
+
+    user_session = UserSession.objects.get()
+    assert user_session.utm_source == "first"
+    assert user_session.referer == "http://localhost/somepath"
+    assert RequestFingerprint.objects.get().user_agent == "agent"
+
+
+def test__buffered__hit_counts(db, client, buffered):
+    client.get("/request-test")
+    client.get("/request-test?param=1")
+    buffer.flush()
+    client.get("/request-test")
+    Client().get("/request-test")
+    buffer.flush()
+
+    assert dict(UrlHitCount.objects.values_list("url__value", "hits")) == {
+        "http://testserver/request-test": 2,
+        "http://testserver/request-test?param=1": 1,
+    }
+
+
+def test__buffered__sketches(db, client, settings, buffered):
+    settings.FINGERPRINT_SKETCHES = "database"
+
+    client.get("/request-test")
+    Client().get("/request-test")
+    buffer.flush()
+
+    assert RequestFingerprint.get_count_for_urls(["http://testserver/request-test"], approximate=True) == {
+        "http://testserver/request-test": 2
+    }
+
+
+def test__buffered__num_queries(db, client, buffered, django_assert_max_num_queries):
+    client.get("/request-test")
+    client.get("/request-test?param=1")
+
+    with django_assert_max_num_queries(16):
+        assert buffer.flush() == 2
+
+
+def test__deferred__store_after_response(db, settings):
+    settings.FINGERPRINT_DEFERRED = True
+
+    @fingerprint
+    def view(request):
+        assert not RequestFingerprint.objects.exists()
+        return HttpResponse("all good")
+
+    request = RequestFactory().get("/deferred-test")
+    SessionMiddleware(lambda request: None).process_request(request)
+
+    response = view(request)
+    assert not RequestFingerprint.objects.exists()
+
+    response.close()
+    assert RequestFingerprint.objects.get().url.value == "http://testserver/deferred-test"
+
+
+def test__deferred__client(db, client, settings):
+    settings.FINGERPRINT_DEFERRED = True
+
+    assert client.get("/request-test", HTTP_USER_AGENT="agent").status_code == 200
+    assert RequestFingerprint.objects.get().user_agent == "agent"
+
+    assert client.get("/async-request-test").status_code == 200
+    assert RequestFingerprint.objects.count() == 2
+
+
+def test__deferred__errors_are_logged(db, client, settings, caplog, monkeypatch):
+    def write_request_fingerprint(entry):
+        raise RuntimeError()
+
+    settings.FINGERPRINT_DEFERRED = True
+    monkeypatch.setattr("fingerprint.capture.write_request_fingerprint", write_request_fingerprint)
+
+    assert client.get("/request-test").status_code == 200
+    assert "Failed to store fingerprint of http://testserver/request-test" in caplog.text
+
+
+def test__intern_headers(db, client, settings):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+
+    client.get("/request-test", HTTP_USER_AGENT="agent", HTTP_ACCEPT="text/html")
+    client.get("/request-test?param=1", HTTP_USER_AGENT="agent")
+    client.get("/async-request-test", HTTP_USER_AGENT="agent", HTTP_CONTENT_LANGUAGE="en")
+
+    assert set(HeaderValue.objects.values_list("value", flat=True)) == {"agent", "text/html", "en"}
+    assert RequestFingerprint.objects.count() == 3
+    for request_fingerprint in RequestFingerprint.objects.all():
+        assert request_fingerprint.user_agent == ""
+        assert request_fingerprint.user_agent_value.value == "agent"
+        assert request_fingerprint.get_header("user_agent") == "agent"
+        assert request_fingerprint.get_header("content_encoding") == ""
+
+
+def test__intern_headers__cached(db, client, settings, django_assert_num_queries):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+
+    client.get("/request-test", HTTP_USER_AGENT="agent")
+    header_value = HeaderValue.objects.get()
+    with django_assert_num_queries(0):
+        assert HeaderValue.objects.get_or_create_ids(["agent"]) == {"agent": header_value.id}
+
+
+def test__intern_headers__buffered(db, client, settings, buffered):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+
+    client.get("/request-test", HTTP_USER_AGENT="agent", HTTP_REFERER="http://localhost/somepath")
+    client.get("/request-test?param=1", HTTP_USER_AGENT="agent")
+    buffer.flush()
+
+    assert HeaderValue.objects.count() == 2
+    assert {request_fingerprint.get_header("referer") for request_fingerprint in RequestFingerprint.objects.all()} == {
+        "http://localhost/somepath",
+        "",
+    }
+    assert set(RequestFingerprint.objects.values_list("user_agent_value__value", flat=True)) == {"agent"}
+
+
+def test__buffered__created(db, client, buffered):
+    with freeze_time("2024-01-01 10:00"):
+        client.get("/request-test")
+    with freeze_time("2024-01-01 10:01"):
+        buffer.flush()
+    assert RequestFingerprint.objects.get().created == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+
+
+def test__buffered__flush_on_interval(transactional_db, client, buffered, settings):
+    settings.FINGERPRINT_BUFFER_FLUSH_INTERVAL = timedelta(milliseconds=500)
+    client.get("/request-test")
+    timer = buffer._timer
+    assert len(buffer) == 1
+
+    timer.join(timeout=5)
+    assert len(buffer) == 0
+    assert RequestFingerprint.objects.count() == 1
+
+
+def test__user_session__get_or_create_ids__existing(db):
+    UserSession.objects.create(session_key="key")
+    ids = UserSession.objects.get_or_create_ids({"key": {}, "other": {}})
+    assert ids["key"] == UserSession.objects.get(session_key="key").id
+    assert UserSession.objects.count() == 2
+    assert UserSession.objects.get_or_create_id("other") == ids["other"]
+
+
+def test__user_session__get_or_create_id__many(db, django_user_model):
+    oldest = UserSession.objects.create(session_key="key")
+    UserSession.objects.create(session_key="key", user=django_user_model.objects.create(username="user"))
+    assert UserSession.objects.get_or_create_id("key") == oldest.id
+
+
+def test__concurrent_first_hits(db, client, monkeypatch):
+    client.get("/request-test")
+
+    # another process stores the first hit of the pair between the lookup and the insert
+    monkeypatch.setattr("fingerprint.capture.get_last_created", lambda *args: RequestFingerprint.objects.none())
+    with freeze_time(now() + timedelta(minutes=1)):
+        client.get("/request-test")
+
+    assert RequestFingerprint.objects.count() == 1
+    assert UrlHitCount.objects.get().hits == 1
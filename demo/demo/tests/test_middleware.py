@@ -0,0 +1,92 @@
+from collections import Counter
+
+import pytest
+from django.test import Client
+
+from fingerprint.middleware import compile_patterns, is_session_sampled
+from fingerprint.models import RequestFingerprint, UserSession
+
+
+@pytest.fixture
+def middleware(settings):
+    settings.MIDDLEWARE = [*settings.MIDDLEWARE, "fingerprint.middleware.FingerprintMiddleware"]
+    settings.FINGERPRINT_EXCLUDE_PATHS = [r"/admin/", r"/request-test"]
+
+
+def test__compile_patterns():
+    assert compile_patterns([]) is None
+
+    pattern = compile_patterns([r"/blog/", r"/news/\d+"])
+    assert pattern.match("/blog/post")
+    assert pattern.match("/news/1")
+    assert not pattern.match("/news/latest")
+    assert not pattern.match("/about/blog/")
+
+
+def test__middleware__fingerprint(db, client, middleware):
+    assert client.get("/session-test").status_code == 200
+
+    fingerprint = RequestFingerprint.objects.get()
+    assert fingerprint.url.value == "http://testserver/session-test"
+
+
+def test__middleware__exclude(db, client, middleware):
+    assert client.get("/admin/").status_code == 302
+    assert not RequestFingerprint.objects.exists()
+
+
+def test__middleware__include(db, client, middleware, settings):
+    settings.FINGERPRINT_INCLUDE_PATHS = [r"/blog/"]
+
+    assert client.get("/session-test").status_code == 200
+    assert not RequestFingerprint.objects.exists()
+
+
+def test__middleware__async_view(db, client, middleware):
+    assert client.get("/async-session-test").status_code == 200
+    assert RequestFingerprint.objects.get().url.value == "http://testserver/async-session-test"
+
+
+@pytest.mark.parametrize("sample_by", ["request", "session"])
+def test__middleware__sampling(db, client, middleware, settings, sample_by):
+    settings.FINGERPRINT_SAMPLE_BY = sample_by
+
+    settings.FINGERPRINT_SAMPLE_RATE = 0
+    assert client.get("/session-test").status_code == 200
+    assert not RequestFingerprint.objects.exists()
+
+    # middleware settings are read once, when the middleware is loaded by the client
+    settings.FINGERPRINT_SAMPLE_RATE = 1
+    assert Client().get("/session-test").status_code == 200
+    assert RequestFingerprint.objects.exists()
+
+
+def test__middleware__sampling__no_session(db, client, middleware, settings):
+    settings.FINGERPRINT_SAMPLE_BY = "session"
+    settings.FINGERPRINT_SAMPLE_RATE = 0
+
+    assert client.get("/plain-test").status_code == 200
+    assert not UserSession.objects.exists()
+    assert settings.SESSION_COOKIE_NAME not in client.cookies
+
+
+def test__middleware__sampling__whole_sessions(db, middleware, settings):
+    settings.FINGERPRINT_SAMPLE_BY = "session"
+    settings.FINGERPRINT_SAMPLE_RATE = 0.5
+
+    for i in range(40):
+        client = Client(REMOTE_ADDR=f"10.0.0.{i}")
+        for page in range(4):
+            assert client.get(f"/plain-test?page={page}").status_code == 200
+
+    hits = Counter(RequestFingerprint.objects.values_list("ip", flat=True))
+    assert set(hits.values()) == {4}
+    assert 0 < len(hits) < 40
+
+
+def test__is_session_sampled():
+    session_keys = [f"session{i}" for i in range(1000)]
+    sampled = [key for key in session_keys if is_session_sampled(key, 0.1)]
+
+    assert 50 < len(sampled) < 150
+    assert sampled == [key for key in session_keys if is_session_sampled(key, 0.1)]
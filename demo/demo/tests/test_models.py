@@ -1,6 +1,12 @@
 from collections import Counter
 
-from fingerprint.models import RequestFingerprint
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.utils.timezone import now
+
+from fingerprint.models import BrowserFingerprint, HashedValueQuerySet, RequestFingerprint, Url, UrlHitCount
 
 
 def test__models__get_count_for_urls__logic(db, client, user):
@@ -57,3 +63,105 @@ def test__models__get_count_for_urls__num_queries(db, client, django_assert_num_
 
     with django_assert_num_queries(2):
         RequestFingerprint.get_count_for_urls([absolute_url1, absolute_url2])
+
+
+def test__models__get_count_for_urls__batched(db, client, settings, django_assert_num_queries):
+    settings.FINGERPRINT_QUERY_BATCH_SIZE = 2
+    for i in range(3):
+        client.get(f"/request-test?param={i}")
+    urls = [f"http://testserver/request-test?param={i}" for i in range(4)]
+
+    # 3 batches of 2 queries each
+    with django_assert_num_queries(6):
+        counts = RequestFingerprint.get_count_for_urls(iter([*urls, urls[0]]))
+    assert counts == Counter({url: 1 for url in urls[:3]})
+
+
+@pytest.mark.parametrize("model", [RequestFingerprint, BrowserFingerprint])
+def test__models__aget_count_for_urls(db, client, model):
+    client.get("/request-test")
+    client.post("/_/", {"id": "visitor"}, HTTP_REFERER="http://testserver/request-test")
+    client.get("/request-test?param=1")
+    urls = ["http://testserver/request-test", "http://testserver/request-test?param=1", "http://testserver/missing"]
+
+    counts = async_to_sync(model.aget_count_for_urls)(urls)
+    assert counts["http://testserver/request-test"] == 1
+    assert counts == model.get_count_for_urls(urls)
+    assert async_to_sync(model.aget_count_for_urls)(urls, since=now()) == model.get_count_for_urls(urls, since=now())
+
+
+def test__url_hit_count__maintained(db, client, user):
+    absolute_url = "http://testserver/request-test"
+
+    client.get("/request-test")
+    client.get("/async-request-test")
+    assert UrlHitCount.objects.get(url__value=absolute_url).hits == 1
+
+    # a new fingerprint of the same session, after the debounce period, is not a new hit
+    RequestFingerprint.objects.update(created="2000-01-01T00:00Z")
+    client.get("/request-test")
+    assert RequestFingerprint.objects.filter(url__value=absolute_url).count() == 2
+    assert UrlHitCount.objects.get(url__value=absolute_url).hits == 1
+
+    client.force_login(user)
+    client.get("/request-test")
+    assert UrlHitCount.objects.get(url__value=absolute_url).hits == 2
+    assert RequestFingerprint.get_count_for_urls([absolute_url]) == Counter({absolute_url: 2})
+
+
+def test__url_hit_count__rebuild(db, client):
+    client.get("/request-test")
+    client.get("/request-test?param=1")
+    RequestFingerprint.objects.filter(url__value="http://testserver/request-test?param=1").delete()
+    UrlHitCount.objects.update(hits=10)
+
+    call_command("rebuild_url_hit_counts")
+    assert dict(UrlHitCount.objects.values_list("url__value", "hits")) == {"http://testserver/request-test": 1}
+
+
+def test__url__value_hash(db):
+    url = Url.objects.create(value="http://testserver/")
+    assert url.value_hash == Url.hash_value("http://testserver/")
+
+    long_value = "http://testserver/" + "a" * 3000
+    id_ = Url.objects.get_or_create_id(long_value)
+    assert Url.objects.get(id=id_).value_hash == Url.hash_value(long_value[:2048])
+    assert Url.objects.get_or_create_id(long_value) == id_
+    assert Url.objects.get_ids([long_value, "http://testserver/"]) == {long_value: id_, "http://testserver/": url.id}
+
+
+def test__url__hash_collision(db, monkeypatch):
+    monkeypatch.setattr(Url, "hash_value", classmethod(lambda cls, value: 42))
+    first = Url.objects.create(value="http://testserver/first")
+
+    assert Url.objects.get_ids(["http://testserver/second"]) == {}
+    second_id = Url.objects.get_or_create_id("http://testserver/second")
+    assert second_id != first.id
+    ids = Url.objects.get_or_create_ids(
+        ["http://testserver/first", "http://testserver/second", "http://testserver/third"]
+    )
+    assert ids["http://testserver/first"] == first.id
+    assert ids["http://testserver/second"] == second_id
+    assert len(set(ids.values())) == 3
+
+
+def test__url__duplicates(db):
+    Url.objects.create(value="http://testserver/")
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Url.objects.create(value="http://testserver/")
+
+
+def test__url__created_concurrently(db, monkeypatch):
+    first = Url.objects.create(value="http://testserver/")
+    get = HashedValueQuerySet.get
+    misses = iter([True])
+
+    def get_after_concurrent_create(self, *args, **kwargs):
+        # the first lookup happens before another process creates the url
+        if next(misses, False):
+            raise Url.DoesNotExist()
+        return get(self, *args, **kwargs)
+
+    monkeypatch.setattr(HashedValueQuerySet, "get", get_after_concurrent_create)
+    assert Url.objects.get_get_or_create(value="http://testserver/") == (first, False)
+    assert Url.objects.filter(value="http://testserver/").count() == 1
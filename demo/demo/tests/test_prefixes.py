@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.management import call_command
+from freezegun import freeze_time
+
+from fingerprint.canonical import get_path_prefixes, get_section_prefix
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, Url, UrlHitRollup, UrlPrefix, UserSession
+
+DAY1 = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+DAY2 = DAY1 + timedelta(days=1)
+
+
+def test__get_path_prefixes():
+    assert get_path_prefixes("https://example.com/blog/post?page=2") == [
+        "https://example.com/",
+        "https://example.com/blog/",
+        "https://example.com/blog/post/",
+    ]
+    assert get_path_prefixes("https://example.com") == ["https://example.com/"]
+    assert get_path_prefixes("/relative/path") == []
+
+
+def test__get_section_prefix():
+    assert get_section_prefix("https://example.com/blog") == "https://example.com/blog/"
+    assert get_section_prefix("https://example.com/blog/?page=2") == "https://example.com/blog/"
+    with pytest.raises(ValueError):
+        get_section_prefix("blog/")
+    with pytest.raises(ValueError):
+        get_section_prefix("https://example.com/" + "a/" * 9)
+
+
+@pytest.fixture
+def hits(db):
+    sessions = [UserSession.objects.create(session_key=f"session-{i}") for i in range(3)]
+    for url, num_sessions, created in (
+        ("https://example.com/blog", 1, DAY1),
+        ("https://example.com/blog/first", 2, DAY1),
+        ("https://example.com/blog/second?page=2", 3, DAY2),
+        ("https://example.com/blogs", 2, DAY2),
+        ("https://example.org/blog/first", 1, DAY2),
+    ):
+        url_id = Url.objects.get_or_create_id(url)
+        with freeze_time(created):
+            for session in sessions[:num_sessions]:
+                RequestFingerprint.objects.create(user_session=session, url_id=url_id)
+                BrowserFingerprint.objects.create(user_session=session, url_id=url_id, visitor_id="visitor")
+
+
+@pytest.mark.parametrize("model", [RequestFingerprint, BrowserFingerprint])
+def test__get_count_for_prefix(hits, model):
+    assert model.get_count_for_prefix("https://example.com/blog/") == 6
+    assert model.get_count_for_prefix("https://example.com/blog") == 6
+    assert model.get_count_for_prefix("https://example.com/blog/first") == 2
+    assert model.get_count_for_prefix("https://example.com/") == 8
+    assert model.get_count_for_prefix("https://example.net/") == 0
+
+
+def test__get_count_for_prefix__window(hits):
+    with freeze_time(DAY2):
+        UrlHitRollup.objects.build()
+    assert RequestFingerprint.get_count_for_prefix("https://example.com/blog/", since=DAY2) == 3
+    assert BrowserFingerprint.get_count_for_prefix("https://example.com/blog/", since=DAY2) == 3
+
+
+def test__get_count_for_prefix__num_queries(hits, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        RequestFingerprint.get_count_for_prefix("https://example.com/blog/")
+
+
+def test__url_prefixes__bulk_created(db):
+    ids = Url.objects.get_or_create_ids(["https://example.com/a/b", "https://example.com/a/c"])
+    assert UrlPrefix.objects.filter(url_id__in=ids.values()).count() == 6
+    assert set(UrlPrefix.objects.get_url_ids("https://example.com/a")) == set(ids.values())
+
+
+def test__rebuild_url_prefixes(hits):
+    UrlPrefix.objects.all().delete()
+    call_command("rebuild_url_prefixes")
+    assert RequestFingerprint.get_count_for_prefix("https://example.com/blog/") == 6
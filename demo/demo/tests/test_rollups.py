@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.management import call_command
+from django.test import Client
+from freezegun import freeze_time
+
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, UrlHitRollup
+
+URL = "http://testserver/request-test"
+DAY1 = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+DAY2 = DAY1 + timedelta(days=1)
+DAY3 = DAY1 + timedelta(days=2)
+
+
+@pytest.fixture
+def history(db, settings):
+    settings.FINGERPRINT_SKETCHES = "database"
+    first, second, third = Client(), Client(), Client()
+    with freeze_time(DAY1):
+        first.get("/request-test")
+        second.get("/request-test")
+    with freeze_time(DAY2):
+        first.get("/request-test")
+    with freeze_time(DAY3):
+        third.get("/request-test")
+        call_command("rollup_url_hits")
+
+
+def test__rollup__window(history):
+    assert UrlHitRollup.objects.count() == 3
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY2) == Counter({URL: 2})
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY1, until=DAY2 - timedelta(hours=10)) == Counter(
+        {URL: 2}
+    )
+    # buckets which start before `until` are included as a whole
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY1, until=DAY2) == Counter({URL: 3})
+    # sessions are unique per bucket, so a session visiting in several buckets is counted in each of them
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY1) == Counter({URL: 4})
+    assert RequestFingerprint.get_count_for_urls([URL]) == Counter({URL: 3})
+
+
+def test__rollup__since_is_rounded_to_bucket(history):
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY2 + timedelta(hours=5)) == Counter({URL: 2})
+
+
+def test__rollup__window__num_queries(history, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        RequestFingerprint.get_count_for_urls([URL], since=DAY1)
+
+
+def test__rollup__incremental(history):
+    with freeze_time(DAY3 + timedelta(hours=1)):
+        Client().get("/request-test")
+        call_command("rollup_url_hits")
+
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY3) == Counter({URL: 2})
+    assert UrlHitRollup.objects.count() == 3
+
+
+def test__rollup__rebuild(history, settings):
+    settings.FINGERPRINT_ROLLUP_PERIOD = "hour"
+    with freeze_time(DAY3 + timedelta(hours=1)):
+        Client().get("/request-test")
+        call_command("rollup_url_hits", rebuild=True)
+
+    assert UrlHitRollup.objects.count() == 4
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY3 + timedelta(minutes=30)) == Counter({URL: 2})
+    assert RequestFingerprint.get_count_for_urls([URL], since=DAY3 + timedelta(hours=1)) == Counter({URL: 1})
+
+
+def test__rollup__approximate_window(history):
+    assert RequestFingerprint.get_count_for_urls([URL], approximate=True, since=DAY2) == Counter({URL: 2})
+    assert RequestFingerprint.get_count_for_urls([URL], approximate=True, until=DAY2) == Counter({URL: 2})
+    # sketches of different days are merged, so sessions are counted once
+    assert RequestFingerprint.get_count_for_urls([URL], approximate=True, since=DAY1) == Counter({URL: 3})
+
+
+def test__browser_fingerprint__window(db, client):
+    with freeze_time(DAY1):
+        client.post("/_/", {"id": "visitor"}, HTTP_REFERER=URL)
+    with freeze_time(DAY2):
+        Client().post("/_/", {"id": "visitor"}, HTTP_REFERER=URL)
+
+    assert BrowserFingerprint.get_count_for_urls([URL], since=DAY2) == Counter({URL: 1})
+    assert BrowserFingerprint.get_count_for_urls([URL], until=DAY2) == Counter({URL: 1})
+    assert BrowserFingerprint.get_count_for_urls([URL]) == Counter({URL: 2})
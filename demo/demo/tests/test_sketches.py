@@ -0,0 +1,111 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import Client
+from freezegun import freeze_time
+
+from fingerprint.hll import NUM_REGISTERS, HyperLogLog
+from fingerprint.models import BrowserFingerprint, RequestFingerprint, UrlSketch
+
+
+@pytest.fixture(params=["database", "cache"])
+def sketches(request, settings):
+    settings.FINGERPRINT_SKETCHES = request.param
+    cache.clear()
+    yield request.param
+    cache.clear()
+
+
+def test__hll__count():
+    sketch = HyperLogLog()
+    assert sketch.count() == 0
+
+    for i in range(10_000):
+        sketch.add(i)
+    assert sketch.count() == pytest.approx(10_000, rel=0.05)
+
+    registers = bytes(sketch)
+    for i in range(10_000):
+        sketch.add(i)
+    assert bytes(sketch) == registers
+    assert len(registers) == NUM_REGISTERS
+
+
+def test__hll__merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(1000):
+        first.add(i)
+        second.add(i + 500)
+
+    assert first.merge(second).count() == pytest.approx(1500, rel=0.05)
+
+
+def test__hll__small_counts_are_exact():
+    sketch = HyperLogLog()
+    for i in range(10):
+        sketch.add(i)
+    assert sketch.count() == 10
+
+
+def test__get_count_for_urls__approximate(db, sketches):
+    absolute_url1 = "http://testserver/request-test"
+    absolute_url2 = "http://testserver/request-test?param=1"
+
+    for _ in range(3):
+        client = Client()
+        client.get("/request-test")
+        client.get("/request-test")
+    Client().get("/request-test?param=1")
+
+    assert RequestFingerprint.get_count_for_urls([absolute_url1, absolute_url2], approximate=True) == Counter(
+        {absolute_url1: 3, absolute_url2: 1}
+    )
+
+
+def test__get_count_for_urls__approximate__merges_days(db, settings):
+    settings.FINGERPRINT_SKETCHES = "database"
+    absolute_url = "http://testserver/request-test"
+
+    with freeze_time("2024-01-01"):
+        Client().get("/request-test")
+    with freeze_time("2024-01-02"):
+        Client().get("/request-test")
+
+    # two days and all time
+    assert UrlSketch.objects.count() == 3
+    assert UrlSketch.objects.get(day=None).url.value == absolute_url
+    assert RequestFingerprint.get_count_for_urls([absolute_url], approximate=True) == Counter({absolute_url: 2})
+    assert RequestFingerprint.get_count_for_urls(
+        [absolute_url], approximate=True, since=datetime(2024, 1, 1, tzinfo=timezone.utc)
+    ) == Counter({absolute_url: 2})
+
+
+def test__get_count_for_urls__approximate__disabled(db, client):
+    client.get("/request-test")
+
+    with pytest.raises(ImproperlyConfigured):
+        RequestFingerprint.get_count_for_urls(["http://testserver/request-test"], approximate=True)
+
+
+def test__get_count_for_urls__approximate__exact_fallback(db, client):
+    client.post("/_/", {"id": "visitor"}, HTTP_REFERER="http://testserver/request-test")
+
+    assert BrowserFingerprint.get_count_for_urls(["http://testserver/request-test"], approximate=True) == Counter(
+        {"http://testserver/request-test": 1}
+    )
+
+
+def test__rebuild_url_sketches(db, client, sketches):
+    absolute_url = "http://testserver/request-test"
+    client.get("/request-test")
+    Client().get("/request-test")
+
+    UrlSketch.objects.all().delete()
+    cache.clear()
+
+    call_command("rebuild_url_sketches")
+    assert RequestFingerprint.get_count_for_urls([absolute_url], approximate=True) == Counter({absolute_url: 2})
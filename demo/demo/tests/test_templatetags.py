@@ -0,0 +1,64 @@
+from asgiref.sync import async_to_sync
+from django.template import Context, Engine, Template
+from django.test import Client
+
+from fingerprint.templatetags.hit_count import PREFETCHED_HIT_COUNTS, aprefetch_hit_counts
+
+TEMPLATE = (
+    """{% load hit_count %}{% hit_counts %}{% for url in urls %}{% hit_count url %},{% endfor %}{% endhit_counts %}"""
+)
+
+
+def test__hit_count(db, client):
+    client.get("/request-test")
+
+    template = Template("{% load hit_count %}{% hit_count url %}")
+    assert template.render(Context({"url": "http://testserver/request-test"})) == "1"
+
+
+def test__hit_counts__batch(db, django_assert_num_queries):
+    for i in range(3):
+        for _ in range(i + 1):
+            Client().get(f"/request-test?page={i}")
+
+    urls = [f"http://testserver/request-test?page={i}" for i in range(50)]
+    with django_assert_num_queries(2):
+        rendered = Template(TEMPLATE).render(Context({"urls": urls}))
+
+    assert rendered == "1,2,3," + "0," * 47
+
+
+def test__hit_counts__empty(db, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        assert Template(TEMPLATE).render(Context({"urls": []})) == ""
+
+
+def test__hit_counts__include(db, client):
+    client.get("/request-test")
+
+    engine = Engine(
+        loaders=[
+            (
+                "django.template.loaders.locmem.Loader",
+                {
+                    "list.html": '{% load hit_count %}{% hit_counts %}<{% include "item.html" %}>{% endhit_counts %}',
+                    "item.html": "{% load hit_count %}{% hit_count url %}",
+                },
+            )
+        ],
+        libraries={"hit_count": "fingerprint.templatetags.hit_count"},
+    )
+    assert engine.get_template("list.html").render(Context({"url": "http://testserver/request-test"})) == "<1>"
+
+
+def test__hit_count__prefetched(db, django_assert_num_queries):
+    for i in range(2):
+        Client().get(f"/request-test?page={i}")
+    urls = [f"http://testserver/request-test?page={i}" for i in range(3)]
+
+    context = async_to_sync(aprefetch_hit_counts)(urls)
+    assert context[PREFETCHED_HIT_COUNTS] == {urls[0]: 1, urls[1]: 1, urls[2]: 0}
+
+    with django_assert_num_queries(0):
+        assert Template(TEMPLATE).render(Context({"urls": urls, **context})) == "1,1,0,"
+        assert Template("{% load hit_count %}{% hit_count url %}").render(Context({"url": urls[0], **context})) == "1"
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from freezegun import freeze_time
+
+from fingerprint.models import UserDevice, UserFingerprintStats, UserSession
+
+DAY = datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+
+
+def visit(client: Client) -> None:
+    client.get("/request-test", HTTP_USER_AGENT="agent 1")
+    client.get("/request-test?param=1", HTTP_USER_AGENT="agent 1")
+    client.get("/request-test?param=2", HTTP_USER_AGENT="agent 2")
+    client.post("/_/", {"id": "visitor 1"}, HTTP_REFERER="http://testserver/")
+    client.post("/_/", {"id": "visitor 2"}, HTTP_REFERER="http://testserver/")
+
+
+def test__user_stats__maintained(user, user_client):
+    visit(user_client)
+
+    stats = UserFingerprintStats.objects.get(user=user)
+    assert stats.num_browser_fingerprints == 2
+    assert stats.num_request_fingerprints == 2
+    assert stats.last_seen is not None
+
+
+def test__user_stats__interned_headers(user, user_client, settings):
+    settings.FINGERPRINT_INTERN_HEADERS = True
+    visit(user_client)
+
+    assert UserFingerprintStats.objects.get(user=user).num_request_fingerprints == 2
+
+
+def test__user_stats__anonymous(db, client):
+    visit(client)
+    assert not UserFingerprintStats.objects.exists()
+
+
+def test__user_stats__anonymous__not_looked_up(db, client):
+    client.get("/request-test")
+    with CaptureQueriesContext(connection) as context:
+        client.get("/request-test?param=1")
+
+    # the user is known from the session loaded to store the fingerprint
+    sqls = [query["sql"] for query in context.captured_queries]
+    assert len([sql for sql in sqls if sql.startswith('SELECT "fingerprint_usersession"')]) == 1
+    assert not [sql for sql in sqls if '"fingerprint_userfingerprintstats"' in sql]
+
+
+def test__user_stats__session_assigned__cached(user, client, settings):
+    settings.FINGERPRINT_USER_SESSION_CACHE_SIZE = 100
+    visit(client)
+    # the session is cached as anonymous until it is saved
+    UserSession.objects.update_or_create(session_key=client.session.session_key, defaults=dict(user=user))
+
+    client.get("/request-test?param=3", HTTP_USER_AGENT="agent 3")
+    assert UserFingerprintStats.objects.get(user=user).num_request_fingerprints == 3
+
+
+def test__user_stats__refreshed_on_assigning_session(user, client):
+    visit(client)
+    UserSession.objects.update_or_create(session_key=client.session.session_key, defaults=dict(user=user))
+
+    stats = UserFingerprintStats.objects.get(user=user)
+    assert (stats.num_browser_fingerprints, stats.num_request_fingerprints) == (2, 2)
+
+
+def test__user_stats__rebuild(user, user_client):
+    visit(user_client)
+    expected = UserFingerprintStats.objects.values().get()
+    UserFingerprintStats.objects.all().delete()
+
+    call_command("rebuild_user_fingerprint_stats")
+    assert UserFingerprintStats.objects.values().get() == expected
+    assert UserDevice.objects.filter(user=user).count() == 4
+
+
+def test__last_seen__coalesced(user, user_client, settings):
+    settings.FINGERPRINT_LAST_SEEN_RESOLUTION = timedelta(minutes=15)
+    with freeze_time(DAY):
+        visit(user_client)
+    session = UserSession.objects.get(user=user)
+    assert session.last_seen == DAY
+    assert UserFingerprintStats.objects.get(user=user).last_seen == DAY
+
+    with freeze_time(DAY + timedelta(minutes=10)):
+        user_client.get("/request-test?param=3", HTTP_USER_AGENT="agent 1")
+    session.refresh_from_db()
+    assert session.last_seen == DAY
+
+    with freeze_time(DAY + timedelta(minutes=20)):
+        user_client.get("/request-test?param=4", HTTP_USER_AGENT="agent 1")
+    session.refresh_from_db()
+    assert session.last_seen == DAY + timedelta(minutes=20)
+    assert UserFingerprintStats.objects.get(user=user).last_seen == DAY + timedelta(minutes=20)
+
+
+def test__last_seen__not_cached(db, client, settings):
+    settings.FINGERPRINT_LAST_SEEN_CACHE_SIZE = 0
+    with freeze_time(DAY):
+        visit(client)
+    with freeze_time(DAY + timedelta(minutes=10)):
+        client.get("/request-test?param=3")
+    assert UserSession.objects.get().last_seen == DAY
+
+
+def test__last_seen__cached(db, client):
+    with freeze_time(DAY):
+        visit(client)
+
+    with freeze_time(DAY + timedelta(minutes=10)), CaptureQueriesContext(connection) as context:
+        client.get("/request-test?param=3")
+    assert not [query for query in context.captured_queries if query["sql"].startswith('UPDATE "fingerprint_user')]
+    assert UserSession.objects.get().last_seen == DAY
+
+
+def test__last_seen__shared_cache(db, client, settings):
+    settings.FINGERPRINT_LAST_SEEN_CACHE_ALIAS = "default"
+    cache.clear()
+    with freeze_time(DAY):
+        visit(client)
+    # as if the next request was handled by another process
+    settings.FINGERPRINT_LAST_SEEN_CACHE_SIZE = 0
+
+    with freeze_time(DAY + timedelta(minutes=10)), CaptureQueriesContext(connection) as context:
+        client.get("/request-test?param=3")
+    assert not [query for query in context.captured_queries if query["sql"].startswith('UPDATE "fingerprint_user')]
+    assert UserSession.objects.get().last_seen == DAY
+    cache.clear()
+
+
+@pytest.fixture
+def cached_client(client, settings) -> Client:
+    settings.FINGERPRINT_USER_SESSION_CACHE_SIZE = 100
+    settings.FINGERPRINT_URL_CACHE_SIZE = 100
+    with freeze_time(DAY):
+        visit(client)
+    return client
+
+
+@pytest.mark.parametrize("logged_in, num_queries", [(False, 4), (True, 5)])
+def test__user_stats__queries_per_hit(user, cached_client, logged_in, num_queries, django_assert_max_num_queries):
+    if logged_in:
+        UserSession.objects.update_or_create(session_key=cached_client.session.session_key, defaults=dict(user=user))
+        with freeze_time(DAY):
+            cached_client.get("/request-test?param=3", HTTP_USER_AGENT="agent 1")
+
+    # a hit of a known url on a known device looks up neither the session nor its user, nor writes `last_seen`
+    with freeze_time(DAY + timedelta(minutes=1)), django_assert_max_num_queries(num_queries):
+        cached_client.get("/request-test?param=1", HTTP_USER_AGENT="agent 1")
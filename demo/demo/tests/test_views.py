@@ -1,6 +1,10 @@
 from datetime import timedelta
 from urllib.parse import urlencode
 
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 from freezegun import freeze_time
 
@@ -233,11 +237,35 @@ def test__request_fingerprint__multiple_already_exist(client, db):
 
     fingerprint = RequestFingerprint.objects.get()
 
-    # create a copy
+    # create a copy, which is not the first hit of its pair
     fingerprint.id = None
+    fingerprint.is_first_hit = False
     fingerprint.save()
 
     assert RequestFingerprint.objects.count() == 2
 
     response = client.get("/request-test")
     assert response.status_code == 200
+
+
+@pytest.mark.parametrize("backend", ["local", "cache"])
+def test__request_fingerprint__debounce__cache_backend(db, user_client, settings, backend):
+    settings.FINGERPRINT_DEBOUNCE_PERIOD = timedelta(minutes=10)
+    settings.FINGERPRINT_DEBOUNCE_BACKEND = backend
+
+    assert user_client.get("/request-test").status_code == 200
+    assert RequestFingerprint.objects.count() == 1
+
+    with CaptureQueriesContext(connection) as context:
+        assert user_client.get("/request-test").status_code == 200
+    assert not [query for query in context.captured_queries if "fingerprint_" in query["sql"]]
+    assert RequestFingerprint.objects.count() == 1
+
+    with freeze_time(now() + timedelta(minutes=11)):
+        assert user_client.get("/request-test").status_code == 200
+        assert RequestFingerprint.objects.count() == 2
+
+        assert user_client.get("/request-test").status_code == 200
+        assert RequestFingerprint.objects.count() == 2
+
+    cache.clear()
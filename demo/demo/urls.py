@@ -1,15 +1,26 @@
 from django.contrib import admin
 from django.urls import include, path
 
-from fingerprint.views import FingerprintView
+from fingerprint.views import AsyncFingerprintView, FingerprintView
 
-from .views import HomeView, remember_session_test_view, request_fingerprint_test_view
+from .views import (
+    HomeView,
+    async_remember_session_test_view,
+    async_request_fingerprint_test_view,
+    plain_test_view,
+    remember_session_test_view,
+    request_fingerprint_test_view,
+)
 
 urlpatterns = [
     path("", HomeView.as_view(), name="home"),
     path("admin/", admin.site.urls),
     path("_/", FingerprintView.as_view(), name="fingerprint"),
     path("__debug__/", include("debug_toolbar.urls")),
+    path("plain-test", plain_test_view),
     path("request-test", request_fingerprint_test_view),
     path("session-test", remember_session_test_view),
+    path("_async/", AsyncFingerprintView.as_view(), name="async-fingerprint"),
+    path("async-request-test", async_request_fingerprint_test_view),
+    path("async-session-test", async_remember_session_test_view),
 ]
@@ -10,6 +10,10 @@ class HomeView(TemplateView):
     template_name = "demo/home.html"
 
 
+def plain_test_view(request):
+    return HttpResponse("all good")
+
+
 @remember_user_session
 def remember_session_test_view(request):
     return HttpResponse("all ok")
@@ -18,3 +22,13 @@ def remember_session_test_view(request):
 @fingerprint
 def request_fingerprint_test_view(request):
     return HttpResponse("all good")
+
+
+@remember_user_session
+async def async_remember_session_test_view(request):
+    return HttpResponse("all ok")
+
+
+@fingerprint
+async def async_request_fingerprint_test_view(request):
+    return HttpResponse("all good")
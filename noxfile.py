@@ -18,7 +18,7 @@ PYPROJECT = nox.project.load_toml("pyproject.toml")
 MAIN_BRANCH_NAME = "master"
 PYTHON_VERSIONS = ["3.10", "3.11", "3.12", "3.13"]
 PYTHON_DEFAULT_VERSION = PYTHON_VERSIONS[-1]
-DJANGO_VERSIONS = ["3.2", "4.2", "5.2"]
+DJANGO_VERSIONS = ["4.2", "5.2"]
 DEMO_APP_DIR = ROOT / "demo"
 
 nox.options.default_venv_backend = "uv"
@@ -146,6 +146,20 @@ def test(session, django: str):
     session.run("pytest", "-vv", *session.posargs)
 
 
+@nox.session(python=PYTHON_DEFAULT_VERSION)
+def benchmark(session):
+    """
+    Benchmark hot paths against the demo project and print results as JSON.
+
+    Set `POSTGRES_*` environment variables to use postgres instead of sqlite, and pass e.g. `-- --output results.json`.
+    """
+    session.install(*PYPROJECT["dependency-groups"]["test"], ".[cache]")
+    if os.environ.get("POSTGRES_DB"):
+        session.install("psycopg[binary]")
+    session.chdir("demo")
+    session.run("python", "manage.py", "benchmark", *session.posargs)
+
+
 @nox.session(python=PYTHON_DEFAULT_VERSION)
 def make_release(session):
     session.install(*PYPROJECT["dependency-groups"]["release"])
@@ -1,18 +1,41 @@
 from __future__ import annotations
 
+import json
 from collections.abc import Iterator
-from datetime import timedelta
-from functools import wraps
-from itertools import chain, islice
+from datetime import datetime, timedelta
+from functools import cached_property, reduce, wraps
+from ipaddress import ip_network
+from itertools import islice
+from operator import or_
 from typing import Callable
 
 from django.contrib import admin
-from django.db.models import Count, Max, Prefetch, Q
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import (
+    Exists,
+    F,
+    GenericIPAddressField,
+    Model,
+    OuterRef,
+    Prefetch,
+    Q,
+    QuerySet,
+    Value,
+    Window,
+)
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Coalesce, RowNumber
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.text import smart_split, unescape_string_literal
 from django.utils.timezone import now
 
-from .models import BrowserFingerprint, RequestFingerprint, UserFingerprint, UserSession
+from .functions import InNetwork
+from .models import AbstractFingerprint, BrowserFingerprint, RequestFingerprint, UserFingerprint, UserSession
 
 try:
     from itertools import pairwise
@@ -22,16 +45,41 @@ except ImportError:
         return zip(items, items[1:])
 
 
+# number of objects shown in a single cell of a changelist
+MAX_ITEMS = 10
+
+
+def latest_per(queryset: QuerySet, partition: str, n: int = MAX_ITEMS) -> QuerySet:
+    """Limit the queryset to `n` latest objects in each partition, by a window function (requires django>=4.2)."""
+    return queryset.annotate(
+        rank=Window(RowNumber(), partition_by=F(partition), order_by=F("created").desc()),
+    ).filter(rank__lte=n)
+
+
+def latest_devices(model: type[AbstractFingerprint], n: int = MAX_ITEMS) -> QuerySet:
+    """Latest fingerprint of each of `n` latest devices (see `DEVICE_FIELDS`) of each session."""
+    # nullable device fields are coalesced, since NULL doesn't equal NULL
+    devices = {
+        f"_{field}": Coalesce(field, 0) if model._meta.get_field(field).null else F(field)
+        for field in model.DEVICE_FIELDS
+    }
+    newer = model.objects.annotate(**devices).filter(
+        user_session=OuterRef("user_session"),
+        created__gt=OuterRef("created"),
+        **{name: OuterRef(name) for name in devices},
+    )
+    return latest_per(model.objects.alias(**devices).filter(~Exists(newer)), "user_session", n=n)
+
+
 class html_objects_list:
-    def __init__(self, format_string: str, max_items: int = 10):
+    def __init__(self, format_string: str, max_items: int = MAX_ITEMS):
         self.format_string = format_string
         self.max_items = max_items
 
     def __call__(self, fn: Callable) -> Callable:
         @wraps(fn)
         def wrapped(*args, **kwargs):
-            results = list(islice(fn(*args, **kwargs), self.max_items))
-            return format_html("<br>".join(self.format_string for _ in results), *chain.from_iterable(results))
+            return format_html_join("<br>", self.format_string, islice(fn(*args, **kwargs), self.max_items))
 
         return wrapped
 
@@ -44,8 +92,9 @@ class UserSessionAdmin(admin.ModelAdmin):
         "browser_fingerprints",
         "request_fingerprints",
         "created",
+        "last_seen",
     )
-    list_filter = ("created",)
+    list_filter = ("created", "last_seen")
     search_fields = (
         "user__username",
         "session_key",
@@ -58,15 +107,11 @@ class UserSessionAdmin(admin.ModelAdmin):
             .get_queryset(request)
             .select_related("user")
             .prefetch_related(
-                Prefetch(
-                    "browserfingerprints",
-                    queryset=BrowserFingerprint.objects.order_by("visitor_id", "-created").distinct("visitor_id"),
-                ),
+                # only fingerprints shown by `html_objects_list` are fetched
+                Prefetch("browserfingerprints", queryset=latest_devices(BrowserFingerprint).order_by("-created")),
                 Prefetch(
                     "requestfingerprints",
-                    queryset=RequestFingerprint.objects.order_by("user_session", "user_agent", "-created").distinct(
-                        "user_session", "user_agent"
-                    ),
+                    queryset=latest_devices(RequestFingerprint).select_related("user_agent_value").order_by("-created"),
                 ),
             )
         )
@@ -90,6 +135,147 @@ class UserSessionAdmin(admin.ModelAdmin):
             )
 
 
+def estimate_count(queryset: QuerySet) -> int | None:
+    """Number of rows of the queryset estimated by the query planner, or None if the database doesn't support it."""
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+    return json.loads(queryset.explain(format="json"))[0]["Plan"]["Plan Rows"]
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator which uses the planner estimate instead of `COUNT(*)` if there are more than `threshold` rows."""
+
+    def __init__(self, *args, threshold: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.is_estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        if (estimate := estimate_count(self.object_list)) is not None and estimate > self.threshold:
+            self.is_estimated = True
+            return estimate
+        return super().count
+
+
+CURSOR_VAR = "cursor"
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist which pages through results ordered by `(-created, -id)` by a cursor, i.e. the last row of
+    the previous page, instead of `OFFSET`, so that deep pages load as fast as the first one.
+
+    Results sorted by other columns are paginated as usual.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.next_page_url = self.first_page_url = None
+        super().__init__(request, *args, **kwargs)
+        # filter and sorting links should lead to the first page
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    @property
+    def keyset_paginated(self) -> bool:
+        return ORDER_VAR not in self.params and not self.show_all
+
+    def get_results(self, request):
+        if not self.keyset_paginated:
+            return super().get_results(request)
+
+        queryset = self.queryset.order_by("-created", "-id")
+        if self.cursor:
+            try:
+                id_, _, created = self.cursor.partition("_")
+                id_, created = int(id_), datetime.fromisoformat(created)
+            except ValueError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=id_))
+            self.first_page_url = self.get_query_string(remove=[CURSOR_VAR])
+
+        # one more row tells whether there is a next page
+        result_list = list(queryset[: self.list_per_page + 1])
+        if len(result_list) > self.list_per_page:
+            last = result_list[self.list_per_page - 1]
+            self.next_page_url = self.get_query_string({CURSOR_VAR: f"{last.id}_{last.created.isoformat()}"})
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.result_list = result_list[: self.list_per_page]
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.can_show_all = False
+        self.multi_page = bool(self.next_page_url or self.first_page_url)
+
+
+class LargeTableAdminMixin:
+    """
+    Opt-in mixin of fingerprint admins for huge tables.
+
+    Counts results by planner estimates (on PostgreSQL) above `estimated_count_threshold` rows, doesn't count
+    unfiltered results at all, and paginates results by a cursor, see `KeysetChangeList`.
+    """
+
+    estimated_count_threshold = 100_000
+    show_full_result_count = False
+    change_list_template = "fingerprint/admin/change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return EstimatedCountPaginator(
+            queryset, per_page, orphans, allow_empty_first_page, threshold=self.estimated_count_threshold
+        )
+
+
+def parse_network(term: str) -> str | None:
+    """Network of a search term which is a full address or a network (`10.0.0.0/8`), None for other terms."""
+    try:
+        return str(ip_network(term, strict=False))
+    except ValueError:
+        return None
+
+
+def is_plain_search_field(model: type[Model], field_name: str) -> bool:
+    """Whether the search field is a path of fields, without a prefix (`^`, `=`, `@`) or a lookup of django search."""
+    if field_name.startswith(("^", "=", "@")):
+        return False
+    for name in field_name.split(LOOKUP_SEP):
+        if model is None:
+            return False
+        try:
+            model = model._meta.get_field(name).related_model
+        except FieldDoesNotExist:
+            return False
+    return True
+
+
+def search_lookup(model: type[Model], field_name: str, term: str) -> Q:
+    """
+    Condition of a search field for a search term, which can use an index of the model's table.
+
+    Fields of related models are searched in subqueries rather than joins (`user_session__in=...`), so that conditions
+    of all search fields refer to indexed columns of the same table. Ip addresses are matched by networks
+    if the term is an address or a network (see `parse_network()`), and by substrings otherwise.
+    """
+    name, _, path = field_name.partition(LOOKUP_SEP)
+    field = model._meta.get_field(name)
+    if path and field.is_relation:
+        related = field.related_model._default_manager.filter(search_lookup(field.related_model, path, term))
+        return Q(**{f"{name}__in": related.values("pk")})
+    if isinstance(field, GenericIPAddressField) and (network := parse_network(term)) is not None:
+        return Q(InNetwork(name, Value(network)))
+    return Q(**{f"{field_name}__icontains": term})
+
+
 class FingerprintBaseAdmin(admin.ModelAdmin):
     list_display: tuple[str, ...] = (
         "id",
@@ -107,6 +293,28 @@ class FingerprintBaseAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("user_session__user")
 
+    def get_search_results(self, request, queryset, search_term):
+        # on PostgreSQL, substring searches use trigram indexes, see `0016_search_indexes` migration;
+        # fields with prefixes or lookups are searched by django, as specified
+        search_fields = self.get_search_fields(request)
+        plain_fields = [field for field in search_fields if is_plain_search_field(self.model, field)]
+        if not (plain_fields and search_term):
+            return super().get_search_results(request, queryset, search_term)
+
+        django_search = admin.ModelAdmin(self.model, self.admin_site)
+        django_search.search_fields = [field for field in search_fields if field not in plain_fields]
+        for bit in smart_split(search_term):
+            term = bit
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            condition = reduce(or_, (search_lookup(self.model, field, term) for field in plain_fields))
+            if django_search.search_fields:
+                # each term may match either kind of fields
+                matched, _ = django_search.get_search_results(request, self.model._default_manager.all(), bit)
+                condition |= Q(pk__in=matched.values("pk"))
+            queryset = queryset.filter(condition)
+        return queryset, False
+
     @admin.display(description="user")
     def get_user(self, instance):
         return instance.user_session.user
@@ -130,7 +338,7 @@ class RequestFingerprintAdmin(FingerprintBaseAdmin):
     list_display = (
         *FingerprintBaseAdmin.list_display,
         "ip",
-        "user_agent",
+        "get_user_agent",
         "created",
     )
 
@@ -140,8 +348,20 @@ class RequestFingerprintAdmin(FingerprintBaseAdmin):
         "accept",
         "content_encoding",
         "content_language",
+        "user_agent_value__value",
+        "accept_value__value",
+        "content_encoding_value__value",
+        "content_language_value__value",
         *FingerprintBaseAdmin.search_fields,
     )
+    raw_id_fields = tuple(f"{name}_value" for name in RequestFingerprint.INTERNED_HEADERS)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user_agent_value")
+
+    @admin.display(description="user agent", ordering="user_agent")
+    def get_user_agent(self, instance):
+        return instance.get_header("user_agent")
 
 
 class NumFingerprintsListFilter(admin.SimpleListFilter):
@@ -202,11 +422,7 @@ class LastFingerprintCreatedListFilter(admin.SimpleListFilter):
         except ValueError:
             return
 
-        since = now() - days
-        return queryset.annotate(
-            last_browser_fingerprint=Max("sessions__browserfingerprints__created"),
-            last_request_fingerprint=Max("sessions__requestfingerprints__created"),
-        ).filter(Q(last_browser_fingerprint__gte=since) | Q(last_request_fingerprint__gte=since))
+        return queryset.filter(fingerprint_stats__last_seen__gte=now() - days)
 
 
 @admin.register(UserFingerprint)
@@ -219,6 +435,7 @@ class UserFingerprintAdmin(admin.ModelAdmin):
         "browser_fingerprints",
         "num_request_fingerprints",
         "request_fingerprints",
+        "last_seen",
     )
     list_filter = (
         LastFingerprintCreatedListFilter,
@@ -235,25 +452,26 @@ class UserFingerprintAdmin(admin.ModelAdmin):
             super()
             .get_queryset(request)
             .prefetch_related(
-                Prefetch("sessions", queryset=UserSession.objects.all().order_by("-created")),
+                # only sessions and fingerprints shown by `html_objects_list` are fetched
+                Prefetch("sessions", queryset=latest_per(UserSession.objects.all(), "user").order_by("-created")),
                 Prefetch(
                     "sessions__browserfingerprints",
-                    queryset=BrowserFingerprint.objects.order_by("visitor_id", "-created").distinct("visitor_id"),
+                    queryset=latest_devices(BrowserFingerprint).order_by("-created"),
                 ),
                 Prefetch(
                     "sessions__requestfingerprints",
-                    queryset=RequestFingerprint.objects.order_by("user_session", "user_agent", "-created").distinct(
-                        "user_session", "user_agent"
-                    ),
+                    queryset=latest_devices(RequestFingerprint).select_related("user_agent_value").order_by("-created"),
                 ),
             )
+            # counts are read from `UserFingerprintStats` instead of aggregating all fingerprints of users
             .annotate(
-                num_browser_fingerprints=Count("sessions__browserfingerprints__visitor_id", distinct=True),
-                num_request_fingerprints=Count("sessions__requestfingerprints__user_agent", distinct=True),
+                num_browser_fingerprints=Coalesce(F("fingerprint_stats__num_browser_fingerprints"), 0),
+                num_request_fingerprints=Coalesce(F("fingerprint_stats__num_request_fingerprints"), 0),
+                last_seen=F("fingerprint_stats__last_seen"),
             )
         )
 
-    @admin.display(description="#")
+    @admin.display(description="#", ordering="num_browser_fingerprints")
     def num_browser_fingerprints(self, instance):
         return format_html(
             '<a href="{}">{}</a>',
@@ -261,7 +479,7 @@ class UserFingerprintAdmin(admin.ModelAdmin):
             instance.num_browser_fingerprints,
         )
 
-    @admin.display(description="#")
+    @admin.display(description="#", ordering="num_request_fingerprints")
     def num_request_fingerprints(self, instance):
         return format_html(
             '<a href="{}">{}</a>',
@@ -269,6 +487,10 @@ class UserFingerprintAdmin(admin.ModelAdmin):
             instance.num_request_fingerprints,
         )
 
+    @admin.display(description="last seen", ordering="last_seen")
+    def last_seen(self, instance):
+        return instance.last_seen
+
     @admin.display(description="last sessions")
     @html_objects_list('{} &nbsp;&nbsp; <a href="{}"><code>{}</code></a>')
     def sessions(self, instance) -> Iterator[tuple]:
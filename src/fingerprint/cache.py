@@ -0,0 +1,397 @@
+"""
+In-process caches used to take hot lookups off the database.
+
+All caches are disabled by default and configured by `FINGERPRINT_*` settings; they are rebuilt
+whenever one of these settings changes (e.g. in tests).
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping which evicts least recently used entries.
+
+    If `ttl` is given, entries also expire after that time. Hits and misses are counted,
+    see `info()`.
+    """
+
+    def __init__(self, maxsize: int, ttl: timedelta | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl.total_seconds() if ttl is not None else None
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, key: Hashable, now: float) -> tuple[bool, Any]:
+        try:
+            value, expires = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        if expires is not None and expires <= now:
+            del self._data[key]
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def _set(self, key: Hashable, value: Any, now: float) -> None:
+        self._data[key] = (value, now + self.ttl if self.ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            found, value = self._get(key, time.monotonic())
+        return value if found else default
+
+    def get_many(self, keys: Iterable[Hashable]) -> dict:
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for key in keys:
+                found, value = self._get(key, now)
+                if found:
+                    result[key] = value
+        return result
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._set(key, value, time.monotonic())
+
+    def set_many(self, data: dict) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, value in data.items():
+                self._set(key, value, now)
+
+    def add(self, key: Hashable, value: Any) -> bool:
+        """Set the value only if the key is not already cached; return whether it was set."""
+        now = time.monotonic()
+        with self._lock:
+            found, _ = self._get(key, now)
+            if not found:
+                self._set(key, value, now)
+        return not found
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self.maxsize, currsize=len(self._data))
+
+
+def make_key(prefix: str, value: str) -> str:
+    """Build a cache key of a bounded length, since `value` may be too long for some cache backends."""
+    return f"fingerprint:{prefix}:{hashlib.md5(value.encode(), usedforsecurity=False).hexdigest()}"
+
+
+def get_shared_cache(setting: str) -> BaseCache | None:
+    """Return django cache configured by `setting` to hold a cache alias, if any."""
+    alias = getattr(settings, setting, None)
+    return caches[alias] if alias else None
+
+
+_settings_caches: list[functools._lru_cache_wrapper] = []
+
+
+def cached_from_settings(fn: Callable[[], Any]) -> functools._lru_cache_wrapper:
+    """Memoize a factory of an object configured by settings, until any `FINGERPRINT_*` setting changes."""
+    cached = functools.cache(fn)
+    _settings_caches.append(cached)
+    return cached
+
+
+@receiver(setting_changed)
+def reset_caches(setting: str, **kwargs) -> None:
+    if setting.startswith("FINGERPRINT_"):
+        for cached in _settings_caches:
+            cached.cache_clear()
+
+
+def get_url_id_cache_ttl() -> timedelta:
+    return getattr(settings, "FINGERPRINT_URL_CACHE_TTL", timedelta(minutes=15))
+
+
+@cached_from_settings
+def get_url_id_cache() -> LRUCache | None:
+    """Cache of `Url.value -> Url.id`, configured by `FINGERPRINT_URL_CACHE_SIZE` and `FINGERPRINT_URL_CACHE_TTL`."""
+    if not (maxsize := getattr(settings, "FINGERPRINT_URL_CACHE_SIZE", 0)):
+        return None
+    return LRUCache(maxsize, ttl=get_url_id_cache_ttl())
+
+
+@cached_from_settings
+def get_user_session_id_cache() -> LRUCache | None:
+    """
+    Cache of `UserSession.session_key -> UserSession.id` and `("user", UserSession.id) -> UserSession.user_id`.
+
+    Configured by `FINGERPRINT_USER_SESSION_CACHE_SIZE` and `FINGERPRINT_USER_SESSION_CACHE_TTL`.
+    """
+    if not (maxsize := getattr(settings, "FINGERPRINT_USER_SESSION_CACHE_SIZE", 0)):
+        return None
+    return LRUCache(maxsize, ttl=getattr(settings, "FINGERPRINT_USER_SESSION_CACHE_TTL", timedelta(hours=1)))
+
+
+@cached_from_settings
+def get_header_value_id_cache() -> LRUCache | None:
+    """
+    Cache of `HeaderValue.value -> HeaderValue.id`, configured by `FINGERPRINT_HEADER_CACHE_SIZE`.
+
+    Header values are never changed once stored, so cached ids don't expire.
+    """
+    if not (maxsize := getattr(settings, "FINGERPRINT_HEADER_CACHE_SIZE", 10_000)):
+        return None
+    return LRUCache(maxsize)
+
+
+def get_last_seen_resolution() -> timedelta:
+    return getattr(settings, "FINGERPRINT_LAST_SEEN_RESOLUTION", timedelta(minutes=15))
+
+
+@cached_from_settings
+def get_last_seen_cache() -> LRUCache | None:
+    """
+    Cache of `(model label, pk) -> last_seen` of user sessions and user stats recently updated by this process.
+
+    Configured by `FINGERPRINT_LAST_SEEN_CACHE_SIZE`; entries expire after `FINGERPRINT_LAST_SEEN_RESOLUTION`.
+    """
+    if not (maxsize := getattr(settings, "FINGERPRINT_LAST_SEEN_CACHE_SIZE", 10_000)):
+        return None
+    return LRUCache(maxsize, ttl=get_last_seen_resolution())
+
+
+def get_recently_seen(label: str, last_seen: dict[int, datetime]) -> set[int]:
+    """
+    Primary keys of objects (of model `label`) whose `last_seen` was updated within the resolution before given times.
+
+    They are looked up in the in-process cache first, and then in django cache `FINGERPRINT_LAST_SEEN_CACHE_ALIAS`,
+    which remembers objects updated by any process.
+    """
+    cached: dict[int, datetime] = {}
+    if (local := get_last_seen_cache()) is not None:
+        cached.update({pk: seen for (_, pk), seen in local.get_many((label, pk) for pk in last_seen).items()})
+
+    if (shared := get_shared_cache("FINGERPRINT_LAST_SEEN_CACHE_ALIAS")) is not None and (
+        missing := last_seen.keys() - cached.keys()
+    ):
+        keys = {make_key("last_seen", f"{label} {pk}"): pk for pk in missing}
+        found = {keys[key]: seen for key, seen in shared.get_many(keys).items()}
+        if local is not None:
+            local.set_many({(label, pk): seen for pk, seen in found.items()})
+        cached.update(found)
+
+    resolution = get_last_seen_resolution()
+    return {pk for pk, seen in cached.items() if last_seen[pk] < seen + resolution}
+
+
+def cache_recently_seen(label: str, last_seen: dict[int, datetime]) -> None:
+    if (local := get_last_seen_cache()) is not None:
+        local.set_many({(label, pk): seen for pk, seen in last_seen.items()})
+    if (shared := get_shared_cache("FINGERPRINT_LAST_SEEN_CACHE_ALIAS")) is not None:
+        shared.set_many(
+            {make_key("last_seen", f"{label} {pk}"): seen for pk, seen in last_seen.items()},
+            timeout=get_last_seen_resolution().total_seconds(),
+        )
+
+
+def get_cached_url_ids(values: set[str]) -> dict[str, int]:
+    """Look up url ids in the in-process cache first, and then in django cache."""
+    ids: dict[str, int] = {}
+    if (local := get_url_id_cache()) is not None:
+        ids.update(local.get_many(values))
+
+    if (shared := get_shared_cache("FINGERPRINT_URL_CACHE_ALIAS")) is not None and (missing := values - ids.keys()):
+        keys = {make_key("url", value): value for value in missing}
+        found = {keys[key]: id_ for key, id_ in shared.get_many(keys).items()}
+        if local is not None:
+            local.set_many(found)
+        ids.update(found)
+
+    return ids
+
+
+async def aget_cached_url_ids(values: set[str]) -> dict[str, int]:
+    """Async version of `get_cached_url_ids()`."""
+    ids: dict[str, int] = {}
+    if (local := get_url_id_cache()) is not None:
+        ids.update(local.get_many(values))
+
+    if (shared := get_shared_cache("FINGERPRINT_URL_CACHE_ALIAS")) is not None and (missing := values - ids.keys()):
+        keys = {make_key("url", value): value for value in missing}
+        found = {keys[key]: id_ for key, id_ in (await shared.aget_many(keys)).items()}
+        if local is not None:
+            local.set_many(found)
+        ids.update(found)
+
+    return ids
+
+
+def cache_url_ids(ids: dict[str, int]) -> None:
+    if not ids:
+        return
+
+    if (local := get_url_id_cache()) is not None:
+        local.set_many(ids)
+
+    if (shared := get_shared_cache("FINGERPRINT_URL_CACHE_ALIAS")) is not None:
+        shared.set_many(
+            {make_key("url", value): id_ for value, id_ in ids.items()},
+            timeout=get_url_id_cache_ttl().total_seconds(),
+        )
+
+
+async def acache_url_ids(ids: dict[str, int]) -> None:
+    """Async version of `cache_url_ids()`."""
+    if not ids:
+        return
+
+    if (local := get_url_id_cache()) is not None:
+        local.set_many(ids)
+
+    if (shared := get_shared_cache("FINGERPRINT_URL_CACHE_ALIAS")) is not None:
+        await shared.aset_many(
+            {make_key("url", value): id_ for value, id_ in ids.items()},
+            timeout=get_url_id_cache_ttl().total_seconds(),
+        )
+
+
+def evict_url_ids(values: Iterable[str]) -> None:
+    values = set(values)
+    if (local := get_url_id_cache()) is not None:
+        for value in values:
+            local.delete(value)
+
+    if (shared := get_shared_cache("FINGERPRINT_URL_CACHE_ALIAS")) is not None:
+        shared.delete_many([make_key("url", value) for value in values])
+
+
+def get_hit_count_cache_ttl() -> timedelta:
+    return getattr(settings, "FINGERPRINT_HIT_COUNT_CACHE_TTL", timedelta(minutes=1))
+
+
+@cached_from_settings
+def get_hit_count_cache() -> LRUCache | None:
+    """
+    Cache of `(namespace, Url.id) -> hit count`.
+
+    Configured by `FINGERPRINT_HIT_COUNT_CACHE_SIZE` and `FINGERPRINT_HIT_COUNT_CACHE_TTL`.
+    """
+    if not (maxsize := getattr(settings, "FINGERPRINT_HIT_COUNT_CACHE_SIZE", 0)):
+        return None
+    return LRUCache(maxsize, ttl=get_hit_count_cache_ttl())
+
+
+def get_cached_hit_counts(namespace: str, url_ids: set[int]) -> dict[int, int]:
+    """Look up hit counts by url id in the in-process cache first, and then in django cache."""
+    hits: dict[int, int] = {}
+    if (local := get_hit_count_cache()) is not None:
+        hits.update(
+            {url_id: count for (_, url_id), count in local.get_many((namespace, url_id) for url_id in url_ids).items()}
+        )
+
+    if (shared := get_shared_cache("FINGERPRINT_HIT_COUNT_CACHE_ALIAS")) is not None and (
+        missing := url_ids - hits.keys()
+    ):
+        keys = {make_key("hits", f"{namespace} {url_id}"): url_id for url_id in missing}
+        found = {keys[key]: count for key, count in shared.get_many(keys).items()}
+        if local is not None:
+            local.set_many({(namespace, url_id): count for url_id, count in found.items()})
+        hits.update(found)
+
+    return hits
+
+
+async def aget_cached_hit_counts(namespace: str, url_ids: set[int]) -> dict[int, int]:
+    """Async version of `get_cached_hit_counts()`."""
+    hits: dict[int, int] = {}
+    if (local := get_hit_count_cache()) is not None:
+        hits.update(
+            {url_id: count for (_, url_id), count in local.get_many((namespace, url_id) for url_id in url_ids).items()}
+        )
+
+    if (shared := get_shared_cache("FINGERPRINT_HIT_COUNT_CACHE_ALIAS")) is not None and (
+        missing := url_ids - hits.keys()
+    ):
+        keys = {make_key("hits", f"{namespace} {url_id}"): url_id for url_id in missing}
+        found = {keys[key]: count for key, count in (await shared.aget_many(keys)).items()}
+        if local is not None:
+            local.set_many({(namespace, url_id): count for url_id, count in found.items()})
+        hits.update(found)
+
+    return hits
+
+
+def cache_hit_counts(namespace: str, hits: dict[int, int]) -> None:
+    if not hits:
+        return
+
+    if (local := get_hit_count_cache()) is not None:
+        local.set_many({(namespace, url_id): count for url_id, count in hits.items()})
+
+    if (shared := get_shared_cache("FINGERPRINT_HIT_COUNT_CACHE_ALIAS")) is not None:
+        shared.set_many(
+            {make_key("hits", f"{namespace} {url_id}"): count for url_id, count in hits.items()},
+            timeout=get_hit_count_cache_ttl().total_seconds(),
+        )
+
+
+async def acache_hit_counts(namespace: str, hits: dict[int, int]) -> None:
+    """Async version of `cache_hit_counts()`."""
+    if not hits:
+        return
+
+    if (local := get_hit_count_cache()) is not None:
+        local.set_many({(namespace, url_id): count for url_id, count in hits.items()})
+
+    if (shared := get_shared_cache("FINGERPRINT_HIT_COUNT_CACHE_ALIAS")) is not None:
+        await shared.aset_many(
+            {make_key("hits", f"{namespace} {url_id}"): count for url_id, count in hits.items()},
+            timeout=get_hit_count_cache_ttl().total_seconds(),
+        )
+
+
+def evict_hit_counts(namespace: str, url_ids: Iterable[int]) -> None:
+    url_ids = set(url_ids)
+    if (local := get_hit_count_cache()) is not None:
+        for url_id in url_ids:
+            local.delete((namespace, url_id))
+
+    if (shared := get_shared_cache("FINGERPRINT_HIT_COUNT_CACHE_ALIAS")) is not None:
+        shared.delete_many([make_key("hits", f"{namespace} {url_id}") for url_id in url_ids])
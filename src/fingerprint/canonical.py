@@ -0,0 +1,139 @@
+"""
+Canonicalization of urls before they are stored or looked up.
+
+By default urls are stored as is, so e.g. `http://example.com/` and `https://example.com/?utm_source=x`
+are counted as different pages. With `FINGERPRINT_URL_CANONICALIZER` set to a dotted path of a callable
+(e.g. `"fingerprint.canonical.canonicalize_url"`), each url is passed through it first.
+"""
+
+from __future__ import annotations
+
+import functools
+from collections.abc import Callable
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cache import cached_from_settings
+
+DEFAULT_IGNORED_PARAMS = (
+    "utm_*",
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass(frozen=True)
+class UrlCanonicalizer:
+    """
+    Configurable canonicalizer of absolute http(s) urls; other values are returned unchanged.
+
+    To customize it, create an instance in your project and point `FINGERPRINT_URL_CANONICALIZER` to it.
+    """
+
+    scheme: str | None = "https"  # fold http and https into this scheme, None to keep the scheme
+    strip_www: bool = True
+    strip_trailing_slash: bool = True
+    ignored_params: tuple[str, ...] = DEFAULT_IGNORED_PARAMS  # shell-style patterns of query parameter names
+    sort_params: bool = True
+
+    def __call__(self, url: str) -> str:
+        # urls may come from clients (e.g. Referer header), so malformed ones are returned unchanged
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            return url
+
+        host = parts.hostname
+        if ":" in host:  # IPv6
+            host = f"[{host}]"
+        if self.strip_www and host.startswith("www."):
+            host = host[4:]
+        netloc = host if port in (None, DEFAULT_PORTS[parts.scheme]) else f"{host}:{port}"
+
+        path = parts.path or "/"
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip("/") or "/"
+
+        params = [
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not any(fnmatchcase(name, pattern) for pattern in self.ignored_params)
+        ]
+        if self.sort_params:
+            params.sort()
+
+        return urlunsplit((self.scheme or parts.scheme, netloc, path, urlencode(params), ""))
+
+
+canonicalize_url = UrlCanonicalizer()
+
+
+@cached_from_settings
+def get_url_canonicalizer() -> Callable[[str], str] | None:
+    """
+    Canonicalizer configured by `FINGERPRINT_URL_CANONICALIZER`.
+
+    Its results are memoized for up to `FINGERPRINT_URL_CANONICALIZER_CACHE_SIZE` urls.
+    """
+    if not (path := getattr(settings, "FINGERPRINT_URL_CANONICALIZER", None)):
+        return None
+    canonicalizer = import_string(path) if isinstance(path, str) else path
+    maxsize = getattr(settings, "FINGERPRINT_URL_CANONICALIZER_CACHE_SIZE", 10_000)
+    return functools.lru_cache(maxsize=maxsize)(canonicalizer)
+
+
+def canonicalize(url: str) -> str:
+    if (canonicalizer := get_url_canonicalizer()) is None:
+        return url
+    return canonicalizer(url)
+
+
+MAX_PREFIX_DEPTH = 8
+
+
+def get_path_prefixes(url: str) -> list[str]:
+    """
+    Prefixes of the url which end at path segment boundaries, from the root of the site down to the url itself.
+
+    E.g. `https://example.com/blog/post?page=2` has prefixes `https://example.com/`, `https://example.com/blog/`
+    and `https://example.com/blog/post/`. Only the first `MAX_PREFIX_DEPTH` segments of the path are considered,
+    and values which are not absolute urls (or are malformed) have no prefixes.
+    """
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return []
+    if not parts.scheme or not parts.netloc:
+        return []
+
+    prefix = f"{parts.scheme}://{parts.netloc}/"
+    prefixes = [prefix]
+    for segment in [segment for segment in parts.path.split("/") if segment][:MAX_PREFIX_DEPTH]:
+        prefix += f"{segment}/"
+        prefixes.append(prefix)
+    return prefixes
+
+
+def get_section_prefix(url: str) -> str:
+    """The deepest of `get_path_prefixes()` of the url, which identifies the section of the site it heads."""
+    if not (prefixes := get_path_prefixes(url)):
+        raise ValueError(f"Not an absolute url: {url!r}")
+    if len([segment for segment in urlsplit(url).path.split("/") if segment]) > MAX_PREFIX_DEPTH:
+        raise ValueError(f"Prefixes deeper than {MAX_PREFIX_DEPTH} path segments are not stored: {url!r}")
+    return prefixes[-1]
@@ -0,0 +1,407 @@
+"""
+Write side of request fingerprinting.
+
+By default `@fingerprint` writes each fingerprint to the database as the request comes in.
+With `FINGERPRINT_BUFFERED = True`, captured fingerprints are queued in-process instead and written
+in batches, once the queue reaches `FINGERPRINT_BUFFER_SIZE` entries or `FINGERPRINT_BUFFER_FLUSH_INTERVAL`
+passes since the first of them was queued. With `FINGERPRINT_DEFERRED = True`, fingerprints are stored (or queued)
+only after the response has been sent. With `FINGERPRINT_INTERN_HEADERS = True`, repeating header values
+are stored once in `HeaderValue` table and fingerprints only refer to them.
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+from collections import Counter
+from collections.abc import Iterable
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from logging import getLogger
+from operator import attrgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Max, QuerySet
+from django.http.response import HttpResponseBase
+
+from .cache import LRUCache, cached_from_settings, make_key
+from .models import (
+    HeaderValue,
+    RequestFingerprint,
+    Url,
+    UrlHitCount,
+    UserSession,
+    add_to_last_seen,
+    add_to_sketches,
+)
+
+log = getLogger(__name__)
+
+
+def get_debounce_period() -> timedelta:
+    return getattr(settings, "FINGERPRINT_DEBOUNCE_PERIOD", timedelta(seconds=10))
+
+
+@cached_from_settings
+def get_debounce_cache() -> LRUCache:
+    return LRUCache(getattr(settings, "FINGERPRINT_DEBOUNCE_CACHE_SIZE", 10_000), ttl=get_debounce_period())
+
+
+def is_debounced(session_key: str, url: str) -> bool:
+    """
+    Check whether (session, url) pair was already fingerprinted within the debounce period, and mark it if not.
+
+    This is a shortcut which doesn't touch the database: with `FINGERPRINT_DEBOUNCE_BACKEND = "local"`, recently
+    seen pairs are kept in-process, and with `"cache"` - in django cache `FINGERPRINT_DEBOUNCE_CACHE_ALIAS`.
+    With the default `"database"` backend this always returns False, and debouncing is done by a database query.
+    """
+    backend = getattr(settings, "FINGERPRINT_DEBOUNCE_BACKEND", "database")
+    if backend == "database":
+        return False
+
+    key = make_key("debounce", f"{session_key} {url}")
+    if backend == "local":
+        return not get_debounce_cache().add(key, True)
+
+    cache = caches[getattr(settings, "FINGERPRINT_DEBOUNCE_CACHE_ALIAS", "default")]
+    return not cache.add(key, True, timeout=get_debounce_period().total_seconds())
+
+
+async def ais_debounced(session_key: str, url: str) -> bool:
+    """Async version of `is_debounced()`."""
+    if getattr(settings, "FINGERPRINT_DEBOUNCE_BACKEND", "database") != "cache":
+        return is_debounced(session_key, url)
+
+    key = make_key("debounce", f"{session_key} {url}")
+    cache = caches[getattr(settings, "FINGERPRINT_DEBOUNCE_CACHE_ALIAS", "default")]
+    return not await cache.aadd(key, True, timeout=get_debounce_period().total_seconds())
+
+
+@dataclass
+class RequestFingerprintEntry:
+    """Everything needed to store a request fingerprint, captured while the request is still available."""
+
+    session_key: str
+    url: str
+    session_defaults: dict
+    fingerprint_defaults: dict
+    captured: datetime
+
+
+def is_interning_headers() -> bool:
+    return getattr(settings, "FINGERPRINT_INTERN_HEADERS", False)
+
+
+def get_header_values(fingerprint_defaults: dict) -> dict[str, str]:
+    """Non-empty values of interned headers, truncated the same way as if they were stored inline."""
+    return {
+        name: value[: RequestFingerprint._meta.get_field(name).max_length]
+        for name in RequestFingerprint.INTERNED_HEADERS
+        if (value := fingerprint_defaults.get(name))
+    }
+
+
+def intern_headers(fingerprint_defaults: dict, header_value_ids: dict[str, int]) -> dict:
+    """Replace inline header values with ids of `HeaderValue`s resolved by `HeaderValue.objects.get_ids()`."""
+    interned = dict(fingerprint_defaults)
+    for name, value in get_header_values(fingerprint_defaults).items():
+        interned[name] = ""
+        interned[f"{name}_value_id"] = header_value_ids[value]
+    return interned
+
+
+def get_last_created(user_session_id: int, url_id: int) -> QuerySet:
+    """Time of the latest fingerprint of the (session, url) pair, which tells both debouncing and first hits."""
+    return (
+        RequestFingerprint.objects.filter(user_session_id=user_session_id, url_id=url_id)
+        .order_by("-created")
+        .values_list("created", flat=True)
+    )
+
+
+def is_recent(entry: RequestFingerprintEntry, last_created: datetime | None) -> bool:
+    return last_created is not None and entry.captured - last_created < get_debounce_period()
+
+
+def set_session_user_id(fingerprint: RequestFingerprint, user_ids: dict[int, int | None]) -> None:
+    """Tell `UserFingerprintStats.objects.add()` the user of the session, if it is known, so it isn't looked up."""
+    if fingerprint.user_session_id in user_ids:
+        fingerprint._session_user_id = user_ids[fingerprint.user_session_id]
+
+
+def write_request_fingerprint(entry: RequestFingerprintEntry) -> None:
+    url_id = Url.objects.get_or_create_id(entry.url)
+    user_ids: dict[int, int | None] = {}
+    user_session_id = UserSession.objects.get_or_create_id(
+        entry.session_key, defaults=entry.session_defaults, user_ids=user_ids
+    )
+
+    fingerprint_defaults = entry.fingerprint_defaults
+    if is_interning_headers():
+        header_values = get_header_values(fingerprint_defaults).values()
+        fingerprint_defaults = intern_headers(
+            fingerprint_defaults, HeaderValue.objects.get_or_create_ids(header_values)
+        )
+
+    last_created = get_last_created(user_session_id, url_id).first()
+    if is_recent(entry, last_created):
+        log.debug("Fingerprint of %s debounced", entry.url)
+        return
+
+    # a concurrent first hit of the same pair violates `unique_first_hit` constraint, and is debounced as well
+    fingerprint = RequestFingerprint(
+        user_session_id=user_session_id,
+        url_id=url_id,
+        created=entry.captured,
+        is_first_hit=last_created is None,
+        **fingerprint_defaults,
+    )
+    set_session_user_id(fingerprint, user_ids)
+    with suppress(IntegrityError), transaction.atomic():
+        fingerprint.save(force_insert=True)
+        log.debug("Fingerprint %s created", fingerprint)
+
+
+async def awrite_request_fingerprint(entry: RequestFingerprintEntry) -> None:
+    """Async version of `write_request_fingerprint()`."""
+    url_id = await Url.objects.aget_or_create_id(entry.url)
+    user_ids: dict[int, int | None] = {}
+    user_session_id = await UserSession.objects.aget_or_create_id(
+        entry.session_key, defaults=entry.session_defaults, user_ids=user_ids
+    )
+
+    fingerprint_defaults = entry.fingerprint_defaults
+    if is_interning_headers():
+        header_values = get_header_values(fingerprint_defaults).values()
+        header_value_ids = await HeaderValue.objects.aget_or_create_ids(header_values)
+        fingerprint_defaults = intern_headers(fingerprint_defaults, header_value_ids)
+
+    last_created = await get_last_created(user_session_id, url_id).afirst()
+    if is_recent(entry, last_created):
+        log.debug("Fingerprint of %s debounced", entry.url)
+        return
+
+    fingerprint = RequestFingerprint(
+        user_session_id=user_session_id,
+        url_id=url_id,
+        created=entry.captured,
+        is_first_hit=last_created is None,
+        **fingerprint_defaults,
+    )
+    set_session_user_id(fingerprint, user_ids)
+    with suppress(IntegrityError):
+        await fingerprint.asave(force_insert=True)
+        log.debug("Fingerprint %s created", fingerprint)
+
+
+def write_request_fingerprints(entries: Iterable[RequestFingerprintEntry]) -> int:
+    """
+    Store many request fingerprints using a constant number of queries.
+
+    Entries for the same (session, url) pair are debounced both against each other and against
+    fingerprints already stored in the database. Returns the number of created fingerprints.
+    """
+
+    debounce_period = get_debounce_period()
+
+    deduplicated: list[RequestFingerprintEntry] = []
+    last_captured: dict[tuple[str, str], datetime] = {}
+    for entry in sorted(entries, key=attrgetter("captured")):
+        key = (entry.session_key, entry.url)
+        if (previous := last_captured.get(key)) is not None and entry.captured - previous < debounce_period:
+            continue
+        last_captured[key] = entry.captured
+        deduplicated.append(entry)
+
+    if not deduplicated:
+        return 0
+
+    with transaction.atomic():
+        url_ids = Url.objects.get_or_create_ids(entry.url for entry in deduplicated)
+        user_ids: dict[int, int | None] = {}
+        session_ids = UserSession.objects.get_or_create_ids(
+            {entry.session_key: entry.session_defaults for entry in deduplicated}, user_ids=user_ids
+        )
+        if interning_headers := is_interning_headers():
+            header_value_ids = HeaderValue.objects.get_or_create_ids(
+                {value for entry in deduplicated for value in get_header_values(entry.fingerprint_defaults).values()}
+            )
+
+        last_created = {
+            (user_session_id, url_id): created
+            for user_session_id, url_id, created in RequestFingerprint.objects.filter(
+                user_session_id__in=set(session_ids.values()),
+                url_id__in=set(url_ids.values()),
+            )
+            .values_list("user_session_id", "url_id")
+            .annotate(last_created=Max("created"))
+            .order_by()
+        }
+
+        fingerprints = []
+        seen = set(last_created)
+        for entry in deduplicated:
+            pair = (session_ids[entry.session_key], url_ids[entry.url])
+            if is_recent(entry, last_created.get(pair)):
+                continue
+            fingerprint = RequestFingerprint(
+                user_session_id=pair[0],
+                url_id=pair[1],
+                created=entry.captured,
+                is_first_hit=pair not in seen,
+                **(
+                    intern_headers(entry.fingerprint_defaults, header_value_ids)
+                    if interning_headers
+                    else entry.fingerprint_defaults
+                ),
+            )
+            set_session_user_id(fingerprint, user_ids)
+            fingerprints.append(fingerprint)
+            seen.add(pair)
+
+        RequestFingerprint.objects.bulk_create(
+            [fingerprint for fingerprint in fingerprints if not fingerprint.is_first_hit]
+        )
+        if first_hits := [fingerprint for fingerprint in fingerprints if fingerprint.is_first_hit]:
+            # like in `write_request_fingerprint()`, first hits which lose to a concurrent writer of the same pair
+            # violate `unique_first_hit` constraint and are dropped, the rest are told by their creation time
+            RequestFingerprint.objects.bulk_create(first_hits, ignore_conflicts=True)
+            stored = set(
+                RequestFingerprint.objects.filter(
+                    user_session_id__in={fingerprint.user_session_id for fingerprint in first_hits},
+                    url_id__in={fingerprint.url_id for fingerprint in first_hits},
+                    is_first_hit=True,
+                ).values_list("user_session_id", "url_id", "created")
+            )
+            fingerprints = [
+                fingerprint
+                for fingerprint in fingerprints
+                if not fingerprint.is_first_hit
+                or (fingerprint.user_session_id, fingerprint.url_id, fingerprint.created) in stored
+            ]
+            first_hits = [fingerprint for fingerprint in fingerprints if fingerprint.is_first_hit]
+
+        # bulk_create doesn't send post_save signal, which maintains hit counts, sketches, last seen and user stats
+        UrlHitCount.objects.increment(Counter(fingerprint.url_id for fingerprint in first_hits))
+        add_to_sketches(fingerprints)
+        add_to_last_seen(fingerprints)
+
+    log.debug("Flushed %d fingerprints out of %d buffered", len(fingerprints), len(deduplicated))
+    return len(fingerprints)
+
+
+class FingerprintBuffer:
+    """
+    Thread-safe in-process queue of request fingerprints waiting to be written.
+
+    Full buffer is flushed by the request which filled it, while a timer started by the first queued entry
+    flushes it from a background thread after `flush_interval`, so entries don't wait for the next request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: list[RequestFingerprintEntry] = []
+        self._timer: threading.Timer | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_size(self) -> int:
+        return getattr(settings, "FINGERPRINT_BUFFER_SIZE", 100)
+
+    @property
+    def flush_interval(self) -> timedelta:
+        return getattr(settings, "FINGERPRINT_BUFFER_FLUSH_INTERVAL", timedelta(seconds=5))
+
+    def add(self, entry: RequestFingerprintEntry) -> bool:
+        """Queue an entry and return whether the buffer is full and due for a flush."""
+        with self._lock:
+            self._entries.append(entry)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval.total_seconds(), self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            return len(self._entries) >= self.max_size
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:
+            # database connections are per-thread, and this thread is done
+            connections.close_all()
+
+    def flush(self) -> int:
+        """
+        Write all queued entries to the database.
+
+        Fingerprinting is best-effort, so a failed flush is logged and its entries are dropped
+        instead of breaking the request which happened to trigger it.
+        """
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not entries:
+            return 0
+
+        try:
+            return write_request_fingerprints(entries)
+        except Exception:
+            log.exception("Failed to flush %d buffered fingerprints", len(entries))
+            return 0
+
+
+buffer = FingerprintBuffer()
+atexit.register(buffer.flush)
+
+
+def is_buffered() -> bool:
+    return getattr(settings, "FINGERPRINT_BUFFERED", False)
+
+
+def store_request_fingerprint(entry: RequestFingerprintEntry) -> None:
+    """Write the fingerprint to the database, or queue it if buffering is enabled."""
+    if not is_buffered():
+        write_request_fingerprint(entry)
+    elif buffer.add(entry):
+        buffer.flush()
+
+
+async def astore_request_fingerprint(entry: RequestFingerprintEntry) -> None:
+    """Async version of `store_request_fingerprint()`."""
+    if not is_buffered():
+        await awrite_request_fingerprint(entry)
+    elif buffer.add(entry):
+        await sync_to_async(buffer.flush)()
+
+
+def store_after_response(response: HttpResponseBase, entry: RequestFingerprintEntry) -> HttpResponseBase:
+    """
+    Store the fingerprint once the response is closed, i.e. after it has been sent to the client.
+
+    This happens outside of the request-response cycle, so errors are logged instead of being raised.
+    """
+
+    def store():
+        try:
+            store_request_fingerprint(entry)
+        except Exception:
+            log.exception("Failed to store fingerprint of %s", entry.url)
+
+    # the server closes the response once it is sent, both with WSGI and ASGI; storing goes before the original
+    # `close()`, which sends `request_finished` signal cleaning up database connections
+    close = response.close
+
+    def store_and_close():
+        store()
+        close()
+
+    response.close = store_and_close  # type: ignore
+    return response
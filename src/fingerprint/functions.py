@@ -0,0 +1,68 @@
+"""Database functions, which compute the same values in SQL as the python code of `fingerprint.models` does."""
+
+from __future__ import annotations
+
+import hashlib
+from ipaddress import ip_address, ip_network
+
+from django.db import NotSupportedError, models
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def hash_value(value: str) -> int:
+    """Signed 64-bit hash of the value, which fits `BigIntegerField`."""
+    return int.from_bytes(hashlib.md5(value.encode(), usedforsecurity=False).digest()[:8], "big", signed=True)
+
+
+class HashValue(models.Func):
+    """`hash_value()` of a text expression, e.g. to look up `HashedValue` objects by `value_hash` in a subquery."""
+
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"HashValue is not supported on {connection.vendor}")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # the first 16 hex digits of md5 are reinterpreted as a signed big-endian 64-bit integer
+        template = "('x' || left(md5(%(expressions)s), 16))::bit(64)::bigint"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # sqlite has no md5, so the python function is registered instead, see `register_hash_value()`
+        return super().as_sql(compiler, connection, function="fingerprint_hash_value", **extra_context)
+
+
+@receiver(connection_created)
+def register_hash_value(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        connection.connection.create_function("fingerprint_hash_value", 1, hash_value, deterministic=True)
+
+
+def in_network(ip: str | None, network: str) -> bool:
+    """Whether the address belongs to the network, e.g. `10.0.0.0/8`."""
+    return ip is not None and ip_address(ip) in ip_network(network)
+
+
+class InNetwork(models.Func):
+    """`in_network()` of an ip address expression, which uses btree indexes of `inet` columns on PostgreSQL."""
+
+    arity = 2
+    output_field = models.BooleanField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"InNetwork is not supported on {connection.vendor}")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        template = "(%(expressions)s::inet)"
+        return super().as_sql(compiler, connection, template=template, arg_joiner=" <<= ", **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # ip addresses are stored as text on sqlite, see `register_in_network()`
+        return super().as_sql(compiler, connection, function="fingerprint_in_network", **extra_context)
+
+
+@receiver(connection_created)
+def register_in_network(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        connection.connection.create_function("fingerprint_in_network", 2, in_network, deterministic=True)
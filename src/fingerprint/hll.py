@@ -0,0 +1,54 @@
+"""
+HyperLogLog sketch for approximate counting of distinct values in constant memory.
+
+See Flajolet et al., "HyperLogLog: the analysis of a near-optimal cardinality estimation algorithm".
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+
+PRECISION = 10
+NUM_REGISTERS = 2**PRECISION  # standard error of estimates is 1.04 / sqrt(NUM_REGISTERS) ~ 3%
+
+
+class HyperLogLog:
+    """
+    Fixed-size array of `NUM_REGISTERS` one-byte registers.
+
+    Adding a value which was already added doesn't change the registers, and sketches of disjoint
+    periods may be merged into a sketch of the whole period.
+    """
+
+    def __init__(self, registers: bytes | None = None):
+        if registers is not None and len(registers) != NUM_REGISTERS:
+            raise ValueError(f"Expected {NUM_REGISTERS} registers, got {len(registers)}")
+        self.registers = bytearray(registers if registers is not None else NUM_REGISTERS)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.registers)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, HyperLogLog) and self.registers == other.registers
+
+    def add(self, value: str | int) -> None:
+        hash_ = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+        index = hash_ >> (64 - PRECISION)
+        rest = hash_ & ((1 << (64 - PRECISION)) - 1)
+        rank = 64 - PRECISION - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        """Merge other sketch into this one in-place, and return this sketch."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / NUM_REGISTERS)
+        estimate = alpha * NUM_REGISTERS**2 / sum(2.0**-register for register in self.registers)
+        if estimate <= 2.5 * NUM_REGISTERS and (zeros := self.registers.count(0)):
+            # linear counting is more accurate for small cardinalities
+            estimate = NUM_REGISTERS * math.log(NUM_REGISTERS / zeros)
+        return round(estimate)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fingerprint.models import UrlHitCount
+
+
+class Command(BaseCommand):
+    help = "Recount unique hits of all urls from existing request fingerprints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        num_urls = UrlHitCount.objects.rebuild(batch_size=batch_size)
+        self.stdout.write(f"Rebuilt hit counts of {num_urls} urls")
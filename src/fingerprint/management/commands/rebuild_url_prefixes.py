@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fingerprint.models import UrlPrefix
+
+
+class Command(BaseCommand):
+    help = "Store path prefixes of all urls again, e.g. after upgrading to a version which stores them differently."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        num_urls = UrlPrefix.objects.rebuild(batch_size=batch_size)
+        self.stdout.write(f"Rebuilt prefixes of {num_urls} urls")
@@ -0,0 +1,33 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fingerprint.models import RequestFingerprint, UrlSketch, add_to_sketches, get_sketch_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Add all existing request fingerprints to HyperLogLog sketches of their urls. "
+        "Sketches stored in the database are recreated from scratch, while sketches in cache are merged into."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, batch_size, **options):
+        if not (backend := get_sketch_backend()):
+            raise CommandError("FINGERPRINT_SKETCHES setting is not set")
+
+        if backend == "database":
+            UrlSketch.objects.all().delete()
+
+        fingerprints = (
+            RequestFingerprint.objects.only("url_id", "user_session_id", "created")
+            .order_by()
+            .iterator(chunk_size=batch_size)
+        )
+        num_fingerprints = 0
+        while batch := list(islice(fingerprints, batch_size)):
+            add_to_sketches(batch)
+            num_fingerprints += len(batch)
+        self.stdout.write(f"Added {num_fingerprints} fingerprints to sketches")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fingerprint.models import UserFingerprintStats
+
+
+class Command(BaseCommand):
+    help = "Recount fingerprint stats of all users from existing fingerprints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        num_users = UserFingerprintStats.objects.rebuild(batch_size=batch_size)
+        self.stdout.write(f"Rebuilt fingerprint stats of {num_users} users")
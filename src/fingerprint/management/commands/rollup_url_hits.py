@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from fingerprint.models import UrlHitRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll up unique hits of urls into time buckets, starting from the last rolled up bucket. "
+        "Should be run periodically, e.g. every hour."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="recount all buckets from the first fingerprint")
+
+    def handle(self, *args, rebuild, **options):
+        num_rows = UrlHitRollup.objects.build(rebuild=rebuild)
+        self.stdout.write(f"Rolled up {num_rows} url buckets")
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+from collections.abc import Iterable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from ipware import get_client_ip
+
+from .views import afingerprint_request, fingerprint_request
+
+
+def compile_patterns(patterns: Iterable[str]) -> re.Pattern | None:
+    """Combine many path regexes into a single one, so that a path is matched against all of them at once."""
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def is_session_sampled(session_key: str, sample_rate: float) -> bool:
+    """Deterministically decide whether the session is sampled, so that it is either always or never fingerprinted."""
+    digest = hashlib.md5(session_key.encode(), usedforsecurity=False).digest()
+    return int.from_bytes(digest[:8], "big") < sample_rate * 2**64
+
+
+# session key storing whether the session is sampled, so that the decision isn't changed by a new sampling key
+SAMPLED_SESSION_KEY = "_fingerprint_sampled"
+
+
+def get_sampling_key(request) -> str:
+    """Key to sample the session by: its session key, or the client's ip and user agent if there is no session yet."""
+    if session_key := request.session.session_key:
+        return session_key
+    return f"{get_client_ip(request)[0]} {request.META.get('HTTP_USER_AGENT', '')}"
+
+
+def is_visit_sampled(request, sample_rate: float) -> bool:
+    """
+    Decide whether requests of the session are sampled, once per session, so that they are all or none fingerprinted.
+
+    The decision is stored in the session. Sessions are only created for sampled visitors, so unsampled visitors
+    without a session don't cost any writes, and are decided again by the same ip and user agent on every request.
+    """
+    session = request.session
+    if (sampled := session.get(SAMPLED_SESSION_KEY)) is not None:
+        return sampled
+
+    sampled = is_session_sampled(get_sampling_key(request), sample_rate)
+    if sampled or session.session_key:
+        session[SAMPLED_SESSION_KEY] = sampled
+    return sampled
+
+
+class FingerprintMiddleware:
+    """
+    Fingerprint requests without decorating every view with `@fingerprint`.
+
+    Only requests with `path_info` matching any of `FINGERPRINT_INCLUDE_PATHS` regexes (all paths by default),
+    and not matching any of `FINGERPRINT_EXCLUDE_PATHS` regexes are fingerprinted. Regexes are matched
+    from the beginning of the path.
+
+    `FINGERPRINT_SAMPLE_RATE` (1.0 by default) allows to fingerprint only a fraction of requests, either chosen
+    randomly per request or consistently per session, depending on `FINGERPRINT_SAMPLE_BY` ("request" or "session").
+
+    This middleware must be placed after `SessionMiddleware`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.include = compile_patterns(getattr(settings, "FINGERPRINT_INCLUDE_PATHS", []))
+        self.exclude = compile_patterns(getattr(settings, "FINGERPRINT_EXCLUDE_PATHS", []))
+        self.sample_rate: float = getattr(settings, "FINGERPRINT_SAMPLE_RATE", 1.0)
+        self.sample_by: str = getattr(settings, "FINGERPRINT_SAMPLE_BY", "request")
+        if self.sample_by not in ("request", "session"):
+            raise ValueError(f"Invalid FINGERPRINT_SAMPLE_BY value: {self.sample_by!r}")
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def is_path_included(self, path: str) -> bool:
+        if self.include is not None and not self.include.match(path):
+            return False
+        return self.exclude is None or not self.exclude.match(path)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if self.is_path_included(request.path_info) and self.is_sampled(request):
+            return fingerprint_request(request, self.get_response)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_path_included(request.path_info) and await self.ais_sampled(request):
+            return await afingerprint_request(request, self.get_response)
+        return await self.get_response(request)
+
+    def is_sampled(self, request) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        if self.sample_by == "request":
+            return random.random() < self.sample_rate
+        return is_visit_sampled(request, self.sample_rate)
+
+    async def ais_sampled(self, request) -> bool:
+        """Async version of `is_sampled()`."""
+        if self.sample_by == "session" and self.sample_rate < 1:
+            # loading the session may query the database
+            return await sync_to_async(self.is_sampled)(request)
+        return self.is_sampled(request)
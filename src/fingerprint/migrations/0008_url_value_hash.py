@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:16
+
+import hashlib
+
+from django.db import migrations, models
+
+import fingerprint.fields
+
+
+def hash_value(value: str) -> int:
+    # same as `Url.hash_value()` at the time of writing this migration
+    return int.from_bytes(hashlib.md5(value.encode(), usedforsecurity=False).digest()[:8], "big", signed=True)
+
+
+def fill_value_hash(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Url = apps.get_model("fingerprint", "Url")
+
+    batch = []
+    for url in Url.objects.using(db_alias).only("id", "value").iterator(chunk_size=2000):
+        url.value_hash = hash_value(url.value)
+        batch.append(url)
+        if len(batch) >= 2000:
+            Url.objects.using(db_alias).bulk_update(batch, ["value_hash"])
+            batch = []
+    Url.objects.using(db_alias).bulk_update(batch, ["value_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0007_alter_url_value"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="url",
+            name="value_hash",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_value_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="url",
+            name="value_hash",
+            field=models.BigIntegerField(unique=True),
+        ),
+        migrations.AlterField(
+            model_name="url",
+            name="value",
+            field=fingerprint.fields.TruncatedCharField(max_length=2048),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import fingerprint.fields
+
+
+def header_value_field():
+    return models.ForeignKey(
+        blank=True,
+        null=True,
+        on_delete=django.db.models.deletion.PROTECT,
+        related_name="+",
+        to="fingerprint.headervalue",
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0008_url_value_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HeaderValue",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("value", fingerprint.fields.TruncatedCharField(max_length=2048)),
+                ("value_hash", models.BigIntegerField(unique=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="accept_value",
+            field=header_value_field(),
+        ),
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="content_encoding_value",
+            field=header_value_field(),
+        ),
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="content_language_value",
+            field=header_value_field(),
+        ),
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="referer_value",
+            field=header_value_field(),
+        ),
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="user_agent_value",
+            field=header_value_field(),
+        ),
+        migrations.AddIndex(
+            model_name="requestfingerprint",
+            index=models.Index(fields=["user_agent_value", "-created"], name="fingerprint_user_ag_8a3793_idx"),
+        ),
+    ]
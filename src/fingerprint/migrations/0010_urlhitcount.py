@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from itertools import islice
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_url_hit_counts(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    RequestFingerprint = apps.get_model("fingerprint", "RequestFingerprint")
+    UrlHitCount = apps.get_model("fingerprint", "UrlHitCount")
+
+    counts = (
+        RequestFingerprint.objects.using(db_alias)
+        .values("url")
+        .annotate(hits=models.Count("user_session", distinct=True))
+        .order_by()
+        .values_list("url", "hits")
+        .iterator(chunk_size=2000)
+    )
+    while batch := list(islice(counts, 2000)):
+        UrlHitCount.objects.using(db_alias).bulk_create(
+            [UrlHitCount(url_id=url_id, hits=hits) for url_id, hits in batch]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0009_headervalue_requestfingerprint_header_values"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UrlHitCount",
+            fields=[
+                (
+                    "url",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="hit_count",
+                        serialize=False,
+                        to="fingerprint.url",
+                    ),
+                ),
+                ("hits", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_url_hit_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0010_urlhitcount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UrlSketch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("registers", models.BinaryField()),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sketches",
+                        to="fingerprint.url",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("url", "day"), name="unique_url_sketch_day")],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0011_urlsketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UrlHitRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bucket", models.DateTimeField()),
+                ("hits", models.PositiveIntegerField()),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="fingerprint.url",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["bucket"], name="fingerprint_bucket_3a91bf_idx")],
+                "constraints": [models.UniqueConstraint(fields=("url", "bucket"), name="unique_url_hit_rollup_bucket")],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:12
+
+import hashlib
+from itertools import islice
+from urllib.parse import urlsplit
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+MAX_PREFIX_DEPTH = 8
+
+
+def get_path_prefixes(url):
+    # same as `fingerprint.canonical.get_path_prefixes()` at the time of writing this migration
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return []
+    if not parts.scheme or not parts.netloc:
+        return []
+
+    prefix = f"{parts.scheme}://{parts.netloc}/"
+    prefixes = [prefix]
+    for segment in [segment for segment in parts.path.split("/") if segment][:MAX_PREFIX_DEPTH]:
+        prefix += f"{segment}/"
+        prefixes.append(prefix)
+    return prefixes
+
+
+def hash_prefix(prefix):
+    return int.from_bytes(hashlib.md5(prefix.encode(), usedforsecurity=False).digest()[:8], "big", signed=True)
+
+
+def fill_url_prefixes(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Url = apps.get_model("fingerprint", "Url")
+    UrlPrefix = apps.get_model("fingerprint", "UrlPrefix")
+
+    urls = Url.objects.using(db_alias).values_list("value", "id").iterator(chunk_size=2000)
+    while batch := list(islice(urls, 2000)):
+        UrlPrefix.objects.using(db_alias).bulk_create(
+            [
+                UrlPrefix(url_id=url_id, prefix_hash=hash_prefix(prefix))
+                for value, url_id in batch
+                for prefix in get_path_prefixes(value)
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0012_urlhitrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UrlPrefix",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("prefix_hash", models.BigIntegerField()),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="prefixes", to="fingerprint.url"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("prefix_hash", "url"), name="unique_url_prefix")],
+            },
+        ),
+        migrations.RunPython(fill_url_prefixes, migrations.RunPython.noop),
+    ]
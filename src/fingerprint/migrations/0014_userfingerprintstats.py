@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_user_fingerprint_stats(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    BrowserFingerprint = apps.get_model("fingerprint", "BrowserFingerprint")
+    RequestFingerprint = apps.get_model("fingerprint", "RequestFingerprint")
+    UserFingerprintStats = apps.get_model("fingerprint", "UserFingerprintStats")
+
+    stats = {}
+    for model, field, num_devices in (
+        (BrowserFingerprint, "num_browser_fingerprints", models.Count("visitor_id", distinct=True)),
+        (
+            RequestFingerprint,
+            "num_request_fingerprints",
+            models.Count("user_agent", distinct=True, filter=models.Q(user_agent_value__isnull=True))
+            + models.Count("user_agent_value", distinct=True),
+        ),
+    ):
+        counts = (
+            model.objects.using(db_alias)
+            .exclude(user_session__user=None)
+            .values("user_session__user")
+            .annotate(devices=num_devices, last_seen=models.Max("created"))
+            .order_by()
+            .values_list("user_session__user", "devices", "last_seen")
+        )
+        for user_id, devices, last_seen in counts.iterator(chunk_size=2000):
+            user_stats = stats.setdefault(user_id, UserFingerprintStats(user_id=user_id))
+            setattr(user_stats, field, devices)
+            user_stats.last_seen = max(filter(None, (user_stats.last_seen, last_seen)))
+
+    UserFingerprintStats.objects.using(db_alias).bulk_create(stats.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("fingerprint", "0013_urlprefix"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserFingerprintStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="fingerprint_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("num_browser_fingerprints", models.PositiveIntegerField(default=0)),
+                ("num_request_fingerprints", models.PositiveIntegerField(default=0)),
+                ("last_seen", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "verbose_name_plural": "user fingerprint stats",
+                "indexes": [
+                    models.Index(fields=["num_browser_fingerprints"], name="fingerprint_num_bro_35a855_idx"),
+                    models.Index(fields=["num_request_fingerprints"], name="fingerprint_num_req_ac1c3f_idx"),
+                    models.Index(fields=["-last_seen"], name="fingerprint_last_se_122d58_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_user_fingerprint_stats, migrations.RunPython.noop),
+    ]
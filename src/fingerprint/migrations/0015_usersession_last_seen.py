@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Greatest
+
+
+def fill_user_session_last_seen(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    UserSession = apps.get_model("fingerprint", "UserSession")
+    BrowserFingerprint = apps.get_model("fingerprint", "BrowserFingerprint")
+    RequestFingerprint = apps.get_model("fingerprint", "RequestFingerprint")
+
+    last_seen = {
+        model: model.objects.using(db_alias)
+        .filter(user_session=models.OuterRef("pk"))
+        .order_by()
+        .values("user_session")
+        .annotate(last_seen=models.Max("created"))
+        .values("last_seen")
+        for model in (BrowserFingerprint, RequestFingerprint)
+    }
+    UserSession.objects.using(db_alias).update(
+        last_seen=Coalesce(
+            Greatest(models.Subquery(last_seen[BrowserFingerprint]), models.Subquery(last_seen[RequestFingerprint])),
+            models.Subquery(last_seen[BrowserFingerprint]),
+            models.Subquery(last_seen[RequestFingerprint]),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0014_userfingerprintstats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usersession",
+            name="last_seen",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="usersession",
+            index=models.Index(fields=["-last_seen"], name="fingerprint_last_se_65590d_idx"),
+        ),
+        migrations.RunPython(fill_user_session_last_seen, migrations.RunPython.noop),
+    ]
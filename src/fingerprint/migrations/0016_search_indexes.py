@@ -0,0 +1,63 @@
+# Trigram indexes for admin substring searches, which are only available on PostgreSQL.
+#
+# Creating `pg_trgm` extension requires a superuser, or an owner of the database on PostgreSQL 13+ (where it is
+# a trusted extension); without these privileges, run `CREATE EXTENSION pg_trgm;` as a superuser before migrating.
+# Indexes are built concurrently, so that they don't block writes to fingerprint tables, hence the migration is not
+# atomic. They are not declared in models, since other databases don't support them.
+
+from django.db import migrations
+from django.db.models import TextField
+from django.db.models.functions import Cast, Upper
+
+TRIGRAM_INDEXES = {
+    "fingerprint_brow_visitor_trgm_idx": ("browserfingerprint", "visitor_id"),
+    "fingerprint_requ_user_ag_trgm_idx": ("requestfingerprint", "user_agent"),
+    "fingerprint_requ_accept_trgm_idx": ("requestfingerprint", "accept"),
+    "fingerprint_requ_content_e_trgm_idx": ("requestfingerprint", "content_encoding"),
+    "fingerprint_requ_content_l_trgm_idx": ("requestfingerprint", "content_language"),
+    "fingerprint_head_value_trgm_idx": ("headervalue", "value"),
+}
+
+
+class PostgreSQLOperations(migrations.SeparateDatabaseAndState):
+    """Database operations which are run on PostgreSQL only, and don't change the state of models."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def get_trigram_operations() -> list[migrations.operations.base.Operation]:
+    try:
+        from django.contrib.postgres.indexes import GinIndex, OpClass
+        from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+    except ImportError:  # psycopg is not installed, so the database is not PostgreSQL
+        return []
+
+    return [
+        TrigramExtension(),
+        *(
+            AddIndexConcurrently(
+                model_name,
+                # same expression as `icontains` lookup compiles to, so that the planner can use the index
+                GinIndex(OpClass(Upper(Cast(field, output_field=TextField())), name="gin_trgm_ops"), name=name),
+            )
+            for name, (model_name, field) in TRIGRAM_INDEXES.items()
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("fingerprint", "0015_usersession_last_seen"),
+    ]
+
+    operations = [
+        PostgreSQLOperations(database_operations=get_trigram_operations()),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def merge_anonymous_user_sessions(apps, schema_editor):
+    """Merge duplicate anonymous sessions, created by concurrent flushes, into the oldest one."""
+    db_alias = schema_editor.connection.alias
+    UserSession = apps.get_model("fingerprint", "UserSession")
+    BrowserFingerprint = apps.get_model("fingerprint", "BrowserFingerprint")
+    RequestFingerprint = apps.get_model("fingerprint", "RequestFingerprint")
+
+    anonymous = UserSession.objects.using(db_alias).filter(user=None)
+    duplicates = (
+        anonymous.values("session_key")
+        .annotate(count=models.Count("id"), oldest_id=models.Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+        .values_list("session_key", "oldest_id")
+    )
+    for session_key, oldest_id in duplicates.iterator(chunk_size=2000):
+        merged = anonymous.filter(session_key=session_key).exclude(id=oldest_id)
+        for model in (BrowserFingerprint, RequestFingerprint):
+            model.objects.using(db_alias).filter(user_session__in=merged).update(user_session_id=oldest_id)
+        merged.delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0016_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="browserfingerprint",
+            name="created",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="requestfingerprint",
+            name="created",
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(merge_anonymous_user_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="usersession",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user", None)), fields=("session_key",), name="unique_anonymous_user_session"
+            ),
+        ),
+    ]
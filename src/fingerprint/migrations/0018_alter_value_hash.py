@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0017_fingerprint_created_anonymous_user_session"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="headervalue",
+            name="value_hash",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name="url",
+            name="value_hash",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddField(
+            model_name="headervalue",
+            name="collision",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="url",
+            name="collision",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        # hashes were unique so far, so existing values are all in the first slot
+        migrations.AddConstraint(
+            model_name="headervalue",
+            constraint=models.UniqueConstraint(
+                fields=("value_hash", "collision"), name="fingerprint_headervalue_unique_hash"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="url",
+            constraint=models.UniqueConstraint(fields=("value_hash", "collision"), name="fingerprint_url_unique_hash"),
+        ),
+    ]
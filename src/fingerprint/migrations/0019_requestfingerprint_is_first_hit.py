@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0018_alter_value_hash"),
+    ]
+
+    # existing fingerprints are left undecided: capture tells first hits by existence of any fingerprint
+    # of the pair, while the flag only guards against concurrent first hits of new pairs
+    operations = [
+        migrations.AddField(
+            model_name="requestfingerprint",
+            name="is_first_hit",
+            field=models.BooleanField(default=None, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="requestfingerprint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_first_hit", True)), fields=("user_session", "url"), name="unique_first_hit"
+            ),
+        ),
+    ]
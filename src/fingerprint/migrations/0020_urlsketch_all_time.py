@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+def merge_registers(registers, other):
+    # same as `HyperLogLog.merge()` at the time of writing this migration
+    return bytes(map(max, registers, other))
+
+
+def fill_all_time_sketches(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    UrlSketch = apps.get_model("fingerprint", "UrlSketch")
+
+    day_sketches = (
+        UrlSketch.objects.using(db_alias)
+        .exclude(day=None)
+        .order_by("url_id")
+        .values_list("url_id", "registers")
+        .iterator(chunk_size=2000)
+    )
+    sketches = {}
+    for url_id, registers in day_sketches:
+        registers = bytes(registers)
+        sketches[url_id] = merge_registers(sketches[url_id], registers) if url_id in sketches else registers
+        if len(sketches) > 2000:
+            # sketches are ordered by url, so all but the last url are complete
+            last_url_id, last_registers = sketches.popitem()
+            UrlSketch.objects.using(db_alias).bulk_create(
+                [UrlSketch(url_id=url_id, day=None, registers=registers) for url_id, registers in sketches.items()]
+            )
+            sketches = {last_url_id: last_registers}
+    UrlSketch.objects.using(db_alias).bulk_create(
+        [UrlSketch(url_id=url_id, day=None, registers=registers) for url_id, registers in sketches.items()]
+    )
+
+
+def delete_all_time_sketches(apps, schema_editor):
+    UrlSketch = apps.get_model("fingerprint", "UrlSketch")
+    UrlSketch.objects.using(schema_editor.connection.alias).filter(day=None).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fingerprint", "0019_requestfingerprint_is_first_hit"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="urlsketch",
+            name="day",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_all_time_sketches, delete_all_time_sketches),
+        migrations.AddConstraint(
+            model_name="urlsketch",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("day", None)), fields=("url",), name="unique_url_sketch_all_time"
+            ),
+        ),
+    ]
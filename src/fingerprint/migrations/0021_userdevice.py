@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:30
+
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def get_device_hash(model_name, device):
+    # same as `AbstractFingerprint.get_device_hash()` at the time of writing this migration
+    value = repr((model_name, *device))
+    return int.from_bytes(hashlib.md5(value.encode(), usedforsecurity=False).digest()[:8], "big", signed=True)
+
+
+def fill_user_devices(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    BrowserFingerprint = apps.get_model("fingerprint", "BrowserFingerprint")
+    RequestFingerprint = apps.get_model("fingerprint", "RequestFingerprint")
+    UserDevice = apps.get_model("fingerprint", "UserDevice")
+
+    batch = []
+    for model, device_fields in (
+        (BrowserFingerprint, ("visitor_id",)),
+        (RequestFingerprint, ("user_agent", "user_agent_value_id")),
+    ):
+        model_name = model._meta.model_name
+        devices = (
+            model.objects.using(db_alias)
+            .exclude(user_session__user=None)
+            .values_list("user_session__user", *device_fields)
+            .distinct()
+            .order_by()
+        )
+        for user_id, *device in devices.iterator(chunk_size=2000):
+            batch.append(UserDevice(user_id=user_id, kind=model_name, device_hash=get_device_hash(model_name, device)))
+            if len(batch) >= 2000:
+                UserDevice.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+                batch = []
+    UserDevice.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("fingerprint", "0020_urlsketch_all_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDevice",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(max_length=32)),
+                ("device_hash", models.BigIntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("user", "device_hash"), name="unique_user_device")],
+            },
+        ),
+        migrations.RunPython(fill_user_devices, migrations.RunPython.noop),
+    ]
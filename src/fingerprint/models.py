@@ -1,24 +1,220 @@
 from __future__ import annotations
 
 import typing
-from collections import Counter
-from contextlib import suppress
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, time, timedelta, timezone
+from functools import reduce
+from itertools import islice
+from logging import getLogger
+from operator import or_
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.sessions.models import Session
+from django.core.cache import BaseCache, caches
+from django.core.exceptions import ImproperlyConfigured
 from django.db import IntegrityError, models, transaction
-from django.db.models import Count, Model
-from django.db.models.signals import post_save
+from django.db.models import (
+    Case,
+    Count,
+    Expression,
+    F,
+    Max,
+    Min,
+    Model,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest, Left, Trunc
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils.timezone import now
 
+from .cache import (
+    acache_hit_counts,
+    acache_url_ids,
+    aget_cached_hit_counts,
+    aget_cached_url_ids,
+    cache_hit_counts,
+    cache_recently_seen,
+    cache_url_ids,
+    evict_hit_counts,
+    evict_url_ids,
+    get_cached_hit_counts,
+    get_cached_url_ids,
+    get_header_value_id_cache,
+    get_last_seen_resolution,
+    get_recently_seen,
+    get_user_session_id_cache,
+    make_key,
+)
+from .canonical import canonicalize, get_path_prefixes, get_section_prefix
 from .fields import TruncatedCharField
+from .functions import HashValue, hash_value
+from .hll import HyperLogLog
 
 if typing.TYPE_CHECKING:
     from django.contrib.auth.models import AbstractBaseUser
     from django.http import HttpRequest
     from django.shortcuts import SupportsGetAbsoluteUrl
 
+log = getLogger(__name__)
+
+
+def get_query_batch_size() -> int:
+    """Max number of values looked up by a single query, see `FINGERPRINT_QUERY_BATCH_SIZE` setting."""
+    return getattr(settings, "FINGERPRINT_QUERY_BATCH_SIZE", 1000)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def update_last_seen(queryset: QuerySet, last_seen: dict[int, datetime]) -> None:
+    """
+    Set `last_seen` of objects by their primary keys, unless it was set within `FINGERPRINT_LAST_SEEN_RESOLUTION`.
+
+    Objects updated recently by this process (or by any process, with `FINGERPRINT_LAST_SEEN_CACHE_ALIAS`) are
+    skipped without querying the database at all, and the rest are updated by a single query which only writes
+    stale rows.
+    """
+    label = queryset.model._meta.label_lower
+    recently_seen = get_recently_seen(label, last_seen)
+    last_seen = {pk: seen for pk, seen in last_seen.items() if pk not in recently_seen}
+    if not last_seen:
+        return
+
+    resolution = get_last_seen_resolution()
+    stale = [Q(pk=pk) & (Q(last_seen=None) | Q(last_seen__lt=seen - resolution)) for pk, seen in last_seen.items()]
+    queryset.filter(reduce(or_, stale)).update(
+        last_seen=Case(*(When(pk=pk, then=Value(seen)) for pk, seen in last_seen.items()), default=F("last_seen"))
+    )
+    cache_recently_seen(label, last_seen)
+
+
+class UserSessionQuerySet(models.QuerySet):
+    def _get_oldest_id(self, session_key: str) -> int:
+        # the oldest session wins, if there are many for the same key, e.g. of different users
+        return self.filter(session_key=session_key).order_by("id").values_list("id", flat=True)[0]
+
+    def get_or_create_id(
+        self, session_key: str, defaults: dict | None = None, user_ids: dict[int, int | None] | None = None
+    ) -> int:
+        """
+        Resolve id of the user session, creating it if needed.
+
+        Resolved ids are cached in-process if `FINGERPRINT_USER_SESSION_CACHE_SIZE` is set;
+        cached ids are invalidated whenever the user session is saved or deleted.
+        If the session is loaded from the database, its user id is cached too and put to `user_ids` (if given),
+        so that the caller doesn't have to look it up with `get_user_ids()`.
+        """
+        cache = get_user_session_id_cache()
+        if cache is not None and (id_ := cache.get(session_key)) is not None:
+            return id_
+
+        try:
+            user_session = self.get_or_create(session_key=session_key, defaults=defaults or {})[0]
+            id_ = user_session.id
+            if user_ids is not None:
+                user_ids[id_] = user_session.user_id
+            if cache is not None:
+                cache.set(("user", id_), user_session.user_id)
+        except self.model.MultipleObjectsReturned:
+            id_ = self._get_oldest_id(session_key)
+        if cache is not None:
+            cache.set(session_key, id_)
+        return id_
+
+    async def aget_or_create_id(
+        self, session_key: str, defaults: dict | None = None, user_ids: dict[int, int | None] | None = None
+    ) -> int:
+        """Async version of `get_or_create_id()`."""
+        cache = get_user_session_id_cache()
+        if cache is not None and (id_ := cache.get(session_key)) is not None:
+            return id_
+
+        try:
+            user_session = (await self.aget_or_create(session_key=session_key, defaults=defaults or {}))[0]
+            id_ = user_session.id
+            if user_ids is not None:
+                user_ids[id_] = user_session.user_id
+            if cache is not None:
+                cache.set(("user", id_), user_session.user_id)
+        except self.model.MultipleObjectsReturned:
+            id_ = await self.filter(session_key=session_key).order_by("id").values_list("id", flat=True).afirst()
+        if cache is not None:
+            cache.set(session_key, id_)
+        return id_
+
+    def get_or_create_ids(
+        self, sessions: dict[str, dict], user_ids: dict[int, int | None] | None = None
+    ) -> dict[str, int]:
+        """
+        Resolve ids of many user sessions at once, creating the missing ones in bulk.
+
+        `sessions` maps session keys to defaults used when the session has to be created.
+        User ids of sessions loaded from the database are put to `user_ids`, see `get_or_create_id()`.
+        """
+        cache = get_user_session_id_cache()
+        ids: dict[str, int] = cache.get_many(sessions) if cache is not None else {}
+        if user_ids is None:
+            user_ids = {}
+
+        if missing := sessions.keys() - ids.keys():
+            found: dict[str, int] = {}
+            # the oldest session wins, if there are many for the same key
+            for session_key, id_, user_id in (
+                self.filter(session_key__in=missing).order_by("-id").values_list("session_key", "id", "user_id")
+            ):
+                found[session_key] = id_
+                user_ids[id_] = user_id
+
+            if to_create := missing - found.keys():
+                # another process may be creating the same sessions, which are re-selected below either way
+                self.bulk_create(
+                    [self.model(session_key=key, **sessions[key]) for key in to_create], ignore_conflicts=True
+                )
+                for session_key, id_, user_id in (
+                    self.filter(session_key__in=to_create).order_by("-id").values_list("session_key", "id", "user_id")
+                ):
+                    found[session_key] = id_
+                    user_ids[id_] = user_id
+
+            if cache is not None:
+                cache.set_many(found)
+                cache.set_many({("user", id_): user_ids[id_] for id_ in found.values()})
+            ids.update(found)
+
+        return ids
+
+    def get_user_ids(self, ids: Iterable[int]) -> dict[int, int | None]:
+        """
+        Resolve user ids of many user sessions by their ids at once; anonymous sessions are mapped to None.
+
+        User ids are cached along with session ids, see `get_or_create_id()`, including None of anonymous sessions;
+        cached user ids are invalidated when the user session is saved, e.g. assigned to a user on login.
+        """
+        cache = get_user_session_id_cache()
+        keys = {("user", id_): id_ for id_ in ids}
+        user_ids = {keys[key]: user_id for key, user_id in cache.get_many(keys).items()} if cache is not None else {}
+
+        if missing := keys.values() - user_ids.keys():
+            found = dict(self.filter(id__in=missing).values_list("id", "user_id"))
+            if cache is not None:
+                cache.set_many({("user", id_): user_id for id_, user_id in found.items()})
+            user_ids.update(found)
+
+        return user_ids
+
 
 class UserSession(models.Model):
     # by default, django stores session data in database; however, we cannot rely on it,
@@ -30,6 +226,8 @@ class UserSession(models.Model):
     )
     session_key: models.CharField = models.CharField(max_length=40)
     created: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+    # time of the last fingerprint, updated at most once per `FINGERPRINT_LAST_SEEN_RESOLUTION`
+    last_seen: models.DateTimeField = models.DateTimeField(blank=True, null=True)
 
     referer: models.CharField = TruncatedCharField(max_length=2047, blank=True)
 
@@ -40,21 +238,43 @@ class UserSession(models.Model):
     utm_content: models.CharField = TruncatedCharField(max_length=255, blank=True)
     utm_term: models.CharField = TruncatedCharField(max_length=255, blank=True)
 
+    objects = UserSessionQuerySet.as_manager()
+
     def __str__(self):
         return self.session_key
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["session_key", "user"], name="unique_user_session"),
+            # NULLs are distinct in the constraint above, so anonymous sessions need their own one
+            models.UniqueConstraint(
+                fields=["session_key"], condition=Q(user=None), name="unique_anonymous_user_session"
+            ),
         ]
         indexes = [
             models.Index(fields=["user", "-created"]),
+            models.Index(fields=["-last_seen"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # to tell whether the session is assigned to another user when it is saved
+        instance._loaded_user_id = instance.__dict__.get("user_id")
+        return instance
+
     def get_value_display(self) -> str:
         return self.session_key[:8]
 
 
+@receiver(post_save, sender=UserSession)
+@receiver(post_delete, sender=UserSession)
+def evict_user_session_id(sender, instance, **kwargs):
+    if (cache := get_user_session_id_cache()) is not None:
+        cache.delete(instance.session_key)
+        cache.delete(("user", instance.id))
+
+
 @receiver(post_save, sender=Session)
 def connect_user_to_session(sender, instance, created, **kwargs):
     if user_id := instance.get_decoded().get("_auth_user_id"):
@@ -64,7 +284,14 @@ def connect_user_to_session(sender, instance, created, **kwargs):
         )
 
 
-class UrlQuerySet(models.QuerySet):
+class HashedValueQuerySet(models.QuerySet):
+    """
+    Queryset of `HashedValue` models, with lookups by value going through the hash index.
+
+    Subclasses may cache resolved ids by overriding `_get_cached_ids()` and `_cache_ids()`, and process
+    objects created in bulk by overriding `_created()`, since `bulk_create()` doesn't send `post_save` signals.
+    """
+
     def get_get_or_create(self, defaults: dict = {}, **query) -> tuple[Model, bool]:
         """
         Try to retrieve an object using simple `get()` query, and fallback to `get_or_create()`
@@ -72,32 +299,344 @@ class UrlQuerySet(models.QuerySet):
 
         This is required for django-cacheops to be able to cache the `get()` query, since it
         cannot cache `get_or_create` queries.
+
+        The object is created in the first `collision` slot of its hash which is free; if the same value
+        is created concurrently, the unique constraint rejects one of the objects, and the other one is returned.
         """
-        with suppress(self.model.DoesNotExist):
+        query = self._with_value_hash(query)
+        try:
             return self.get(**query), False
+        except self.model.DoesNotExist:
+            pass
 
-        with transaction.atomic():
+        for collision in range(self.model.MAX_COLLISIONS):
             try:
-                return self.create(**{**query, **defaults}), True
+                with transaction.atomic():
+                    return self.create(**{**query, **defaults, "collision": collision}), True
             except IntegrityError:
-                return self.get(**query), False
+                # either the value was created concurrently, or the slot is taken by a value with the same hash
+                try:
+                    return self.get(**query), False
+                except self.model.DoesNotExist:
+                    continue
+        raise IntegrityError(f"Too many values with hash {query['value_hash']}")
 
+    async def aget_get_or_create(self, defaults: dict = {}, **query) -> tuple[Model, bool]:
+        """Async version of `get_get_or_create()`."""
+        query = self._with_value_hash(query)
+        try:
+            return await self.aget(**query), False
+        except self.model.DoesNotExist:
+            pass
 
-class Url(models.Model):
-    value = TruncatedCharField(max_length=2048, unique=True)
+        for collision in range(self.model.MAX_COLLISIONS):
+            try:
+                return await self.acreate(**{**query, **defaults, "collision": collision}), True
+            except IntegrityError:
+                try:
+                    return await self.aget(**query), False
+                except self.model.DoesNotExist:
+                    continue
+        raise IntegrityError(f"Too many values with hash {query['value_hash']}")
 
-    objects = UrlQuerySet.as_manager()
+    def _truncate(self, value: str) -> str:
+        return value[: self.model._meta.get_field("value").max_length]
+
+    def _with_value_hash(self, query: dict) -> dict:
+        """Add `value_hash` to a lookup by `value`, so that the lookup uses the narrow hash index."""
+        if "value" not in query:
+            return query
+        value = self._truncate(query["value"])
+        return {**query, "value": value, "value_hash": self.model.hash_value(value)}
+
+    def _filter_by_values(self, values: set[str]) -> dict[str, int]:
+        hashes = {self.model.hash_value(value) for value in values}
+        # values are compared as well, so that a hash collision doesn't resolve to a wrong object
+        return {
+            value: id_
+            for batch in batched(hashes, get_query_batch_size())
+            for value, id_ in self.filter(value_hash__in=batch).values_list("value", "id")
+            if value in values
+        }
+
+    def _get_cached_ids(self, values: set[str]) -> dict[str, int]:
+        return {}
+
+    async def _aget_cached_ids(self, values: set[str]) -> dict[str, int]:
+        return self._get_cached_ids(values)
+
+    def _cache_ids(self, ids: dict[str, int]) -> None:
+        pass
+
+    async def _acache_ids(self, ids: dict[str, int]) -> None:
+        self._cache_ids(ids)
+
+    def _created(self, ids: dict[str, int]) -> None:
+        pass
+
+    async def _acreated(self, ids: dict[str, int]) -> None:
+        self._created(ids)
+
+    def get_or_create_id(self, value: str) -> int:
+        """Resolve id of the object by its value, creating it if needed."""
+        value = self._truncate(value)
+        if (id_ := self._get_cached_ids({value}).get(value)) is not None:
+            return id_
+
+        id_ = self.get_get_or_create(value=value)[0].id
+        self._cache_ids({value: id_})
+        return id_
+
+    async def aget_or_create_id(self, value: str) -> int:
+        """Async version of `get_or_create_id()`."""
+        value = self._truncate(value)
+        if (id_ := (await self._aget_cached_ids({value})).get(value)) is not None:
+            return id_
+
+        id_ = (await self.aget_get_or_create(value=value))[0].id
+        await self._acache_ids({value: id_})
+        return id_
+
+    def get_ids(self, values: Iterable[str], create: bool = False) -> dict[str, int]:
+        """
+        Resolve ids of many objects by their values at once, optionally creating the missing ones in bulk.
+
+        Too long values are matched by their truncated form, the same way they are stored.
+        Values which don't exist (and were not created) are omitted from the result.
+        """
+        truncated = {value: self._truncate(value) for value in values}
+
+        ids = self._get_cached_ids(set(truncated.values()))
+        if missing := set(truncated.values()) - ids.keys():
+            found = self._filter_by_values(missing)
+            if create and (to_create := missing - found.keys()):
+                # values created concurrently are re-selected, and ones colliding with other values are created
+                # one by one in the next free slot
+                self.bulk_create(
+                    [self.model(value=value, value_hash=self.model.hash_value(value)) for value in to_create],
+                    ignore_conflicts=True,
+                )
+                created = self._filter_by_values(to_create)
+                self._created(created)
+                for value in to_create - created.keys():
+                    created[value] = self.get_get_or_create(value=value)[0].id
+                found.update(created)
+            self._cache_ids(found)
+            ids.update(found)
+
+        return {value: ids[truncated_value] for value, truncated_value in truncated.items() if truncated_value in ids}
+
+    def get_or_create_ids(self, values: Iterable[str]) -> dict[str, int]:
+        return self.get_ids(values, create=True)
+
+    async def _afilter_by_values(self, values: set[str]) -> dict[str, int]:
+        hashes = {self.model.hash_value(value) for value in values}
+        ids = {}
+        for batch in batched(hashes, get_query_batch_size()):
+            async for value, id_ in self.filter(value_hash__in=batch).values_list("value", "id"):
+                if value in values:
+                    ids[value] = id_
+        return ids
+
+    async def aget_ids(self, values: Iterable[str], create: bool = False) -> dict[str, int]:
+        """Async version of `get_ids()`."""
+        truncated = {value: self._truncate(value) for value in values}
+
+        ids = await self._aget_cached_ids(set(truncated.values()))
+        if missing := set(truncated.values()) - ids.keys():
+            found = await self._afilter_by_values(missing)
+            if create and (to_create := missing - found.keys()):
+                await self.abulk_create(
+                    [self.model(value=value, value_hash=self.model.hash_value(value)) for value in to_create],
+                    ignore_conflicts=True,
+                )
+                created = await self._afilter_by_values(to_create)
+                await self._acreated(created)
+                for value in to_create - created.keys():
+                    created[value] = (await self.aget_get_or_create(value=value))[0].id
+                found.update(created)
+            await self._acache_ids(found)
+            ids.update(found)
+
+        return {value: ids[truncated_value] for value, truncated_value in truncated.items() if truncated_value in ids}
+
+    async def aget_or_create_ids(self, values: Iterable[str]) -> dict[str, int]:
+        return await self.aget_ids(values, create=True)
+
+
+class HashedValue(models.Model):
+    """
+    A (possibly long) string value stored once and referred to by id.
+
+    Instead of the value itself, its fixed-width hash is indexed, and all lookups by value
+    should use both `value_hash` and `value` (see `HashedValueQuerySet`). Values with colliding hashes
+    are stored in different `collision` slots of the hash, which are unique together with it,
+    so that the same value can't be stored twice.
+    """
+
+    # max number of distinct values with the same hash
+    MAX_COLLISIONS = 8
+
+    value = TruncatedCharField(max_length=2048)
+    value_hash = models.BigIntegerField()
+    collision = models.PositiveSmallIntegerField(default=0)
+
+    objects = HashedValueQuerySet.as_manager()
+
+    class Meta:  # noqa: D106
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=["value_hash", "collision"], name="%(app_label)s_%(class)s_unique_hash"),
+        ]
 
     def __str__(self) -> str:
         return self.value
 
+    def save(self, *args, **kwargs):
+        self.value_hash = self.hash_value(self.value)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def hash_value(cls, value: str) -> int:
+        """Signed 64-bit hash of the (truncated) value, which fits `BigIntegerField`."""
+        return hash_value(value[: cls._meta.get_field("value").max_length])
+
+    @classmethod
+    def get_expression_lookup(cls, expression: Expression | OuterRef, prefix: str = "") -> dict:
+        """Lookup by a value computed in the database, which goes through the hash index like `_with_value_hash()`."""
+        value = Left(expression, cls._meta.get_field("value").max_length)
+        return {f"{prefix}value_hash": HashValue(value), f"{prefix}value": value}
+
+
+class UrlQuerySet(HashedValueQuerySet):
+    """
+    Resolved url ids are cached in-process and in django cache, if enabled by
+    `FINGERPRINT_URL_CACHE_SIZE` and `FINGERPRINT_URL_CACHE_ALIAS` settings respectively.
+    """
+
+    def _get_cached_ids(self, values: set[str]) -> dict[str, int]:
+        return get_cached_url_ids(values)
+
+    async def _aget_cached_ids(self, values: set[str]) -> dict[str, int]:
+        return await aget_cached_url_ids(values)
+
+    def _cache_ids(self, ids: dict[str, int]) -> None:
+        cache_url_ids(ids)
+
+    async def _acache_ids(self, ids: dict[str, int]) -> None:
+        await acache_url_ids(ids)
+
+    def _created(self, ids: dict[str, int]) -> None:
+        UrlPrefix.objects.add(ids)
+
+    async def _acreated(self, ids: dict[str, int]) -> None:
+        await UrlPrefix.objects.aadd(ids)
+
+
+class Url(HashedValue):
+    """Absolute url of a fingerprinted page."""
+
+    objects = UrlQuerySet.as_manager()
+
+
+class HeaderValueQuerySet(HashedValueQuerySet):
+    """Resolved header value ids are cached in-process, see `FINGERPRINT_HEADER_CACHE_SIZE` setting."""
+
+    def _get_cached_ids(self, values: set[str]) -> dict[str, int]:
+        if (cache := get_header_value_id_cache()) is None:
+            return {}
+        return cache.get_many(values)
+
+    def _cache_ids(self, ids: dict[str, int]) -> None:
+        if (cache := get_header_value_id_cache()) is not None:
+            cache.set_many(ids)
+
+
+class HeaderValue(HashedValue):
+    """Distinct value of a request header, shared by all request fingerprints which have it."""
+
+    objects = HeaderValueQuerySet.as_manager()
+
+
+@receiver(post_delete, sender=Url)
+def evict_deleted_url(sender, instance, **kwargs):
+    evict_url_ids([instance.value])
+
+
+class UrlPrefixQuerySet(models.QuerySet):
+    def _build(self, ids: dict[str, int]) -> list[UrlPrefix]:
+        return [
+            self.model(url_id=url_id, prefix_hash=Url.hash_value(prefix))
+            for value, url_id in ids.items()
+            for prefix in get_path_prefixes(value)
+        ]
+
+    def add(self, ids: dict[str, int]) -> None:
+        """Store prefixes of urls, given as a mapping of url values to their ids."""
+        self.bulk_create(self._build(ids), ignore_conflicts=True, batch_size=1000)
+
+    async def aadd(self, ids: dict[str, int]) -> None:
+        """Async version of `add()`."""
+        await self.abulk_create(self._build(ids), ignore_conflicts=True, batch_size=1000)
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """Store prefixes of all urls from scratch, and return the number of urls."""
+        urls = Url.objects.values_list("value", "id").iterator(chunk_size=batch_size)
+
+        num_urls = 0
+        with transaction.atomic():
+            self.all().delete()
+            while batch := dict(islice(urls, batch_size)):
+                self.add(batch)
+                num_urls += len(batch)
+        return num_urls
+
+    def get_url_ids(self, prefix: str) -> UrlPrefixQuerySet:
+        """
+        Ids of urls under the prefix, as a queryset to be used as a subquery.
+
+        The prefix is canonicalized the same way as urls are, and matched at path segment boundaries,
+        so e.g. `https://example.com/blog` matches `https://example.com/blog/post`, but not `https://example.com/blogs`.
+        """
+        prefix_hash = Url.hash_value(get_section_prefix(canonicalize(prefix)))
+        return self.filter(prefix_hash=prefix_hash).values_list("url_id", flat=True)
+
+
+class UrlPrefix(models.Model):
+    """
+    Hash of a prefix of the url (see `fingerprint.canonical.get_path_prefixes()`), so that urls of a section
+    of the site are found by a single index lookup.
+
+    Prefixes are stored when urls are created; run `manage.py rebuild_url_prefixes` to store them for all urls again.
+    """
+
+    url = models.ForeignKey(Url, on_delete=models.CASCADE, related_name="prefixes")
+    prefix_hash = models.BigIntegerField()
+
+    objects = UrlPrefixQuerySet.as_manager()
+
+    class Meta:  # noqa: D106
+        constraints = [
+            models.UniqueConstraint(fields=["prefix_hash", "url"], name="unique_url_prefix"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.url_id} {self.prefix_hash}"
+
+
+@receiver(post_save, sender=Url)
+def add_url_prefixes(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UrlPrefix.objects.add({instance.value: instance.id})
+
 
 class AbstractFingerprint(models.Model):
     user_session: models.ForeignKey = models.ForeignKey(
         UserSession, on_delete=models.CASCADE, related_name="%(model_name)ss"
     )
     url: models.ForeignKey = models.ForeignKey(Url, on_delete=models.CASCADE, related_name="%(model_name)ss")
-    created: models.DateTimeField = models.DateTimeField(auto_now_add=True)
+    # not `auto_now_add`, so that buffered and deferred fingerprints keep the time of their request
+    created: models.DateTimeField = models.DateTimeField(default=now, editable=False)
 
     class Meta:
         abstract = True
@@ -110,37 +649,243 @@ class AbstractFingerprint(models.Model):
     def user(self) -> AbstractBaseUser | None:
         return self.user_session.user
 
+    # fields which tell devices of a user apart, and the field of `UserFingerprintStats` counting them
+    DEVICE_FIELDS: tuple[str, ...] = ()
+    STATS_FIELD: str = ""
+
+    def get_device(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.DEVICE_FIELDS)
+
     @classmethod
-    def get_count_for_urls(cls, urls: list[str]) -> Counter[str]:
-        existing_urls = dict(Url.objects.filter(value__in=urls).values_list("id", "value"))
+    def get_device_hash(cls, device: tuple) -> int:
+        """Hash of the device, which identifies it among `UserDevice` objects of a user."""
+        return hash_value(repr((cls._meta.model_name, *device)))
+
+    @classmethod
+    def get_count_for_url_ids(
+        cls,
+        url_ids: Iterable[int],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[int, int]:
+        """
+        Number of unique sessions by url id; urls without any hits are omitted.
+
+        If `since` and/or `until` are given, only fingerprints created within [since, until) are counted.
+        Only `RequestFingerprint` keeps sketches for approximate counts, so other models count exactly
+        regardless of `approximate`.
+        """
+        fingerprints = cls.objects.filter(url__in=url_ids)
+        if since is not None:
+            fingerprints = fingerprints.filter(created__gte=since)
+        if until is not None:
+            fingerprints = fingerprints.filter(created__lt=until)
 
         # this is SELECT COUNT(*) GROUP BY in django:
-        ids_and_hits = (
-            cls.objects.filter(url__in=existing_urls)
-            .values("url")
+        return dict(
+            fingerprints.values("url")
+            .annotate(hits=Count("user_session", distinct=True))
+            .order_by("url")
+            .values_list("url", "hits")
+        )
+
+    @classmethod
+    async def aget_count_for_url_ids(
+        cls,
+        url_ids: Iterable[int],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[int, int]:
+        """Async version of `get_count_for_url_ids()`."""
+        fingerprints = cls.objects.filter(url__in=url_ids)
+        if since is not None:
+            fingerprints = fingerprints.filter(created__gte=since)
+        if until is not None:
+            fingerprints = fingerprints.filter(created__lt=until)
+
+        counts = (
+            fingerprints.values("url")
             .annotate(hits=Count("user_session", distinct=True))
             .order_by("url")
             .values_list("url", "hits")
         )
+        return {url_id: hits async for url_id, hits in counts}
 
-        counter = Counter({existing_urls[id_]: hits for id_, hits in ids_and_hits})
+    @classmethod
+    def get_hit_count_cache_namespace(cls, approximate: bool = False) -> str:
+        return f"{cls._meta.label_lower}:{'approximate' if approximate else 'exact'}"
 
-        max_length = Url._meta.get_field("value").max_length
-        counter.update({url: counter[url[:max_length]] for url in urls if len(url) > max_length})
+    @classmethod
+    def get_cached_count_for_url_ids(cls, url_ids: set[int], approximate: bool = False) -> dict[int, int]:
+        """`get_count_for_url_ids()` behind a cache configured by `FINGERPRINT_HIT_COUNT_CACHE_*` settings."""
+        namespace = cls.get_hit_count_cache_namespace(approximate=approximate)
+        hits = get_cached_hit_counts(namespace, url_ids)
+        if missing := url_ids - hits.keys():
+            found = cls.get_count_for_url_ids(missing, approximate=approximate)
+            # urls without hits are cached as well
+            found = {url_id: found.get(url_id, 0) for url_id in missing}
+            cache_hit_counts(namespace, found)
+            hits.update(found)
+        return {url_id: count for url_id, count in hits.items() if count}
+
+    @classmethod
+    async def aget_cached_count_for_url_ids(cls, url_ids: set[int], approximate: bool = False) -> dict[int, int]:
+        """Async version of `get_cached_count_for_url_ids()`."""
+        namespace = cls.get_hit_count_cache_namespace(approximate=approximate)
+        hits = await aget_cached_hit_counts(namespace, url_ids)
+        if missing := url_ids - hits.keys():
+            found = await cls.aget_count_for_url_ids(missing, approximate=approximate)
+            found = {url_id: found.get(url_id, 0) for url_id in missing}
+            await acache_hit_counts(namespace, found)
+            hits.update(found)
+        return {url_id: count for url_id, count in hits.items() if count}
+
+    @classmethod
+    def get_count_for_urls(
+        cls,
+        urls: Iterable[str],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> Counter[str]:
+        """
+        Number of unique sessions by url; urls are canonicalized the same way as when they are stored.
+
+        Urls are resolved and counted in batches of `FINGERPRINT_QUERY_BATCH_SIZE`, so that huge url lists
+        (e.g. of a whole sitemap) don't exceed query parameter limits; each batch takes two queries at most.
+        """
+        counter: Counter[str] = Counter()
+        for batch in batched(urls, get_query_batch_size()):
+            canonical_urls = {url: canonicalize(url) for url in batch}
+            ids = Url.objects.get_ids(set(canonical_urls.values()))
+            url_ids = {url: ids[canonical_url] for url, canonical_url in canonical_urls.items() if canonical_url in ids}
+
+            if since is None and until is None:
+                hits_by_id = cls.get_cached_count_for_url_ids(set(url_ids.values()), approximate=approximate)
+            else:
+                # windows are usually relative to the current time, so caching them is pointless
+                hits_by_id = cls.get_count_for_url_ids(
+                    set(url_ids.values()), approximate=approximate, since=since, until=until
+                )
+            for url, id_ in url_ids.items():
+                if id_ in hits_by_id:
+                    counter[url] = hits_by_id[id_]
+        return counter
+
+    @classmethod
+    async def aget_count_for_urls(
+        cls,
+        urls: Iterable[str],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> Counter[str]:
+        """Async version of `get_count_for_urls()`."""
+        counter: Counter[str] = Counter()
+        for batch in batched(urls, get_query_batch_size()):
+            canonical_urls = {url: canonicalize(url) for url in batch}
+            ids = await Url.objects.aget_ids(set(canonical_urls.values()))
+            url_ids = {url: ids[canonical_url] for url, canonical_url in canonical_urls.items() if canonical_url in ids}
+
+            if since is None and until is None:
+                hits_by_id = await cls.aget_cached_count_for_url_ids(set(url_ids.values()), approximate=approximate)
+            else:
+                hits_by_id = await cls.aget_count_for_url_ids(
+                    set(url_ids.values()), approximate=approximate, since=since, until=until
+                )
+            for url, id_ in url_ids.items():
+                if id_ in hits_by_id:
+                    counter[url] = hits_by_id[id_]
         return counter
 
     @classmethod
     def get_count_for_objects(
-        cls, request: HttpRequest, objects: list[SupportsGetAbsoluteUrl]
+        cls,
+        request: HttpRequest,
+        objects: list[SupportsGetAbsoluteUrl],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
     ) -> Counter[SupportsGetAbsoluteUrl]:
         url_to_object = {request.build_absolute_uri(obj.get_absolute_url()): obj for obj in objects}
-        counter = cls.get_count_for_urls(set(url_to_object.keys()))
+        counter = cls.get_count_for_urls(set(url_to_object.keys()), approximate=approximate, since=since, until=until)
         return Counter({obj: counter[url] for url, obj in url_to_object.items()})
 
+    @classmethod
+    async def aget_count_for_objects(
+        cls,
+        request: HttpRequest,
+        objects: list[SupportsGetAbsoluteUrl],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> Counter[SupportsGetAbsoluteUrl]:
+        """Async version of `get_count_for_objects()`."""
+        url_to_object = {request.build_absolute_uri(obj.get_absolute_url()): obj for obj in objects}
+        counter = await cls.aget_count_for_urls(
+            set(url_to_object.keys()), approximate=approximate, since=since, until=until
+        )
+        return Counter({obj: counter[url] for url, obj in url_to_object.items()})
+
+    @classmethod
+    def get_count_for_prefix(
+        cls,
+        prefix: str,
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        """
+        Total number of hits of urls under the prefix, e.g. `https://example.com/blog/`.
+
+        This is the sum of unique sessions of each url, so a session which visited many urls of the section
+        is counted once per url. See `UrlPrefixQuerySet.get_url_ids()` for how the prefix is matched.
+        """
+        url_ids = UrlPrefix.objects.get_url_ids(prefix)
+        return sum(cls.get_count_for_url_ids(url_ids, approximate=approximate, since=since, until=until).values())
+
+    @classmethod
+    def get_hit_count_subquery(
+        cls, url_lookup: dict, since: datetime | None = None, until: datetime | None = None
+    ) -> QuerySet:
+        """Queryset of a single value, the number of unique sessions of the url found by `url_lookup`."""
+        fingerprints = cls.objects.filter(**url_lookup)
+        if since is not None:
+            fingerprints = fingerprints.filter(created__gte=since)
+        if until is not None:
+            fingerprints = fingerprints.filter(created__lt=until)
+        return fingerprints.values("url").annotate(hits=Count("user_session", distinct=True)).order_by().values("hits")
+
+    @classmethod
+    def annotate_hit_counts(
+        cls,
+        queryset: QuerySet,
+        url_expression: Expression,
+        name: str = "hit_count",
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> QuerySet:
+        """
+        Annotate objects of the queryset with the number of unique sessions of their urls, computed by a subquery.
+
+        `url_expression` builds the absolute url of an object from its fields the same way as urls are stored
+        (i.e. already canonicalized), e.g. `Concat(Value("https://example.com/articles/"), "slug")`.
+        Unlike `get_count_for_objects()`, the annotation may be used for ordering and filtering.
+        """
+        url_alias = f"_{name}_url"
+        url_lookup = Url.get_expression_lookup(OuterRef(url_alias), prefix="url__")
+        hits = cls.get_hit_count_subquery(url_lookup, since=since, until=until)
+        return queryset.alias(**{url_alias: url_expression}).annotate(**{name: Coalesce(Subquery(hits), 0)})
+
 
 class BrowserFingerprint(AbstractFingerprint):
     visitor_id: models.CharField = models.CharField(max_length=255)
 
+    DEVICE_FIELDS = ("visitor_id",)
+    STATS_FIELD = "num_browser_fingerprints"
+
     def __str__(self) -> str:
         return self.visitor_id
 
@@ -163,18 +908,684 @@ class RequestFingerprint(AbstractFingerprint):
     referer: models.CharField = TruncatedCharField(max_length=2047, blank=True)
     cf_ipcountry: models.CharField = TruncatedCharField(max_length=16, blank=True)
 
+    # with `FINGERPRINT_INTERN_HEADERS = True`, these headers are stored in `HeaderValue` table
+    # and referred to by `<header>_value` fields, while the inline fields are left blank
+    INTERNED_HEADERS = ("user_agent", "accept", "content_encoding", "content_language", "referer")
+
+    user_agent_value = models.ForeignKey(HeaderValue, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+    accept_value = models.ForeignKey(HeaderValue, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+    content_encoding_value = models.ForeignKey(
+        HeaderValue, null=True, blank=True, on_delete=models.PROTECT, related_name="+"
+    )
+    content_language_value = models.ForeignKey(
+        HeaderValue, null=True, blank=True, on_delete=models.PROTECT, related_name="+"
+    )
+    referer_value = models.ForeignKey(HeaderValue, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+
+    # whether this is the first fingerprint of its (user session, url) pair, which is counted by `UrlHitCount`;
+    # decided on capture and unique per pair, so that concurrent first hits are not counted twice, and left
+    # undecided (None) for fingerprints created otherwise
+    is_first_hit = models.BooleanField(null=True, default=None)
+
+    # user agents are either inline or interned, depending on `FINGERPRINT_INTERN_HEADERS`
+    DEVICE_FIELDS = ("user_agent", "user_agent_value_id")
+    STATS_FIELD = "num_request_fingerprints"
+
     def __str__(self):
-        return f"{self.ip} {self.user_agent}"
+        return f"{self.ip} {self.get_header('user_agent')}"
 
     class Meta(AbstractFingerprint.Meta):  # noqa: D106
         indexes = [
             *AbstractFingerprint.Meta.indexes,
             models.Index(fields=["ip", "-created"]),
             models.Index(fields=["user_agent", "-created"]),
+            models.Index(fields=["user_agent_value", "-created"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_session", "url"], condition=Q(is_first_hit=True), name="unique_first_hit"
+            ),
         ]
 
+    def get_header(self, name: str) -> str:
+        """Value of one of `INTERNED_HEADERS`, whether it is stored inline or interned."""
+        if value := getattr(self, name):
+            return value
+        if getattr(self, f"{name}_value_id") is None:
+            return ""
+        return getattr(self, f"{name}_value").value
+
     def get_value_display(self) -> str:
-        return self.user_agent[:24] + "..."
+        return self.get_header("user_agent")[:24] + "..."
+
+    @classmethod
+    def get_count_for_url_ids(
+        cls,
+        url_ids: Iterable[int],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[int, int]:
+        """
+        Read hit counts maintained in `UrlHitCount` table instead of aggregating all fingerprints.
+
+        Approximate counts are estimated from HyperLogLog sketches, see `FINGERPRINT_SKETCHES` setting.
+        Counts within a window are read from `UrlHitRollup` buckets (or daily sketches, if approximate),
+        and the window is extended to the start of the bucket containing `since`.
+        """
+        if approximate:
+            return {
+                url_id: hits
+                for url_id, sketch in get_sketches(set(url_ids), since=since, until=until).items()
+                if (hits := sketch.count())
+            }
+
+        if since is not None or until is not None:
+            return UrlHitRollup.objects.in_window(since, until).get_counts(url_ids)
+
+        return dict(UrlHitCount.objects.filter(url_id__in=url_ids, hits__gt=0).values_list("url_id", "hits"))
+
+    @classmethod
+    async def aget_count_for_url_ids(
+        cls,
+        url_ids: Iterable[int],
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> dict[int, int]:
+        """Async version of `get_count_for_url_ids()`."""
+        if approximate:
+            # merging sketches is CPU-bound anyway, so it is done in a thread
+            return await sync_to_async(cls.get_count_for_url_ids)(url_ids, approximate=True, since=since, until=until)
+
+        if since is not None or until is not None:
+            return await UrlHitRollup.objects.in_window(since, until).aget_counts(url_ids)
+
+        counts = UrlHitCount.objects.filter(url_id__in=url_ids, hits__gt=0).values_list("url_id", "hits")
+        return {url_id: hits async for url_id, hits in counts}
+
+    @classmethod
+    def get_count_for_prefix(
+        cls,
+        prefix: str,
+        approximate: bool = False,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        """Sum hit counters (or rollups, within a window) of urls under the prefix in a single query."""
+        if approximate:
+            return super().get_count_for_prefix(prefix, approximate=True, since=since, until=until)
+
+        if since is not None or until is not None:
+            counts = UrlHitRollup.objects.in_window(since, until)
+        else:
+            counts = UrlHitCount.objects.all()
+        url_ids = UrlPrefix.objects.get_url_ids(prefix)
+        return counts.filter(url_id__in=url_ids).aggregate(total=Sum("hits"))["total"] or 0
+
+    @classmethod
+    def get_hit_count_subquery(
+        cls, url_lookup: dict, since: datetime | None = None, until: datetime | None = None
+    ) -> QuerySet:
+        """Read the hit counter (or sum rollups, within a window) of the url instead of aggregating fingerprints."""
+        if since is None and until is None:
+            return UrlHitCount.objects.filter(**url_lookup).values("hits")
+        return (
+            UrlHitRollup.objects.in_window(since, until)
+            .filter(**url_lookup)
+            .values("url")
+            .annotate(total=Sum("hits"))
+            .order_by()
+            .values("total")
+        )
+
+
+def invalidate_hit_counts(url_ids: Iterable[int], approximate: bool = False) -> None:
+    """
+    Evict cached hit counts of request fingerprints, unless disabled by `FINGERPRINT_HIT_COUNT_CACHE_INVALIDATE`.
+
+    Counts are evicted once the current transaction is committed, so that they are not cached again from
+    a concurrent request which doesn't see the changes yet.
+    """
+    if getattr(settings, "FINGERPRINT_HIT_COUNT_CACHE_INVALIDATE", True):
+        namespace = RequestFingerprint.get_hit_count_cache_namespace(approximate=approximate)
+        url_ids = list(url_ids)
+        transaction.on_commit(lambda: evict_hit_counts(namespace, url_ids))
+
+
+class UrlHitCountQuerySet(models.QuerySet):
+    def increment(self, hits: Counter[int]) -> None:
+        """Add hits to counters of urls by their ids, creating missing counters."""
+        if not (hits := +hits):
+            return
+
+        self.bulk_create([self.model(url_id=url_id) for url_id in hits], ignore_conflicts=True)
+        url_ids_by_delta = defaultdict(list)
+        for url_id, delta in hits.items():
+            url_ids_by_delta[delta].append(url_id)
+        for delta, url_ids in url_ids_by_delta.items():
+            self.filter(url_id__in=url_ids).update(hits=F("hits") + delta)
+        invalidate_hit_counts(hits.keys())
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """Recount hits of all urls from request fingerprints, and return the number of urls with hits."""
+        counts = (
+            RequestFingerprint.objects.values("url")
+            .annotate(hits=Count("user_session", distinct=True))
+            .order_by()
+            .values_list("url", "hits")
+            .iterator(chunk_size=batch_size)
+        )
+
+        num_urls = 0
+        with transaction.atomic():
+            self.all().delete()
+            while batch := list(islice(counts, batch_size)):
+                self.bulk_create([self.model(url_id=url_id, hits=hits) for url_id, hits in batch])
+                num_urls += len(batch)
+        return num_urls
+
+
+class UrlHitCount(models.Model):
+    """
+    Number of unique sessions which visited the url, maintained as request fingerprints are stored.
+
+    The counter is incremented whenever a (url, user session) pair is fingerprinted for the first time, so that
+    hit counts are read by primary key instead of aggregating the whole `RequestFingerprint` table. First hits
+    are told apart on capture, see `RequestFingerprint.is_first_hit`. Deleting request fingerprints doesn't
+    decrement it; run `manage.py rebuild_url_hit_counts` to recount all urls.
+    """
+
+    url = models.OneToOneField(Url, primary_key=True, on_delete=models.CASCADE, related_name="hit_count")
+    hits = models.PositiveIntegerField(default=0)
+
+    objects = UrlHitCountQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f"{self.url_id}: {self.hits}"
+
+
+@receiver(post_save, sender=RequestFingerprint)
+def count_url_hit(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+
+    is_first_hit = instance.is_first_hit
+    if is_first_hit is None:
+        is_first_hit = (
+            not RequestFingerprint.objects.filter(user_session_id=instance.user_session_id, url_id=instance.url_id)
+            .exclude(id=instance.id)
+            .exists()
+        )
+    if is_first_hit:
+        UrlHitCount.objects.increment(Counter({instance.url_id: 1}))
+
+
+def get_sketch_backend() -> str | None:
+    """Where HyperLogLog sketches of url hits are kept: "database", "cache" or nowhere (None, default)."""
+    return getattr(settings, "FINGERPRINT_SKETCHES", None)
+
+
+def get_sketch_cache() -> BaseCache:
+    return caches[getattr(settings, "FINGERPRINT_SKETCH_CACHE_ALIAS", "default")]
+
+
+class UrlSketchQuerySet(models.QuerySet):
+    def add(self, sketches: dict[int, HyperLogLog], day: date | None, max_attempts: int = 5) -> None:
+        """
+        Merge sketches into stored sketches of urls by their ids for the given day, or for all time if it is None.
+
+        Stored sketches are only updated if their registers change, and only if they were not changed
+        concurrently since they were read; otherwise the merge is retried.
+        """
+        pending = sketches
+        for _ in range(max_attempts):
+            stored = dict(self.filter(url_id__in=pending, day=day).values_list("url_id", "registers"))
+            if missing := pending.keys() - stored.keys():
+                self.bulk_create(
+                    [self.model(url_id=url_id, day=day, registers=bytes(HyperLogLog())) for url_id in missing],
+                    ignore_conflicts=True,
+                )
+                stored.update(self.filter(url_id__in=missing, day=day).values_list("url_id", "registers"))
+
+            conflicts = {}
+            changed = []
+            for url_id, sketch in pending.items():
+                registers = bytes(stored[url_id])
+                merged = bytes(HyperLogLog(registers).merge(sketch))
+                if merged == registers:
+                    continue
+                if self.filter(url_id=url_id, day=day, registers=registers).update(registers=merged):
+                    changed.append(url_id)
+                else:
+                    conflicts[url_id] = sketch
+            invalidate_hit_counts(changed, approximate=True)
+
+            if not (pending := conflicts):
+                return
+
+        log.warning("Failed to update sketches of %d urls after %d attempts", len(pending), max_attempts)
+
+    def get_sketches(self, url_ids: Iterable[int]) -> dict[int, HyperLogLog]:
+        """Merge sketches in the queryset (e.g. of days within a window) by url id."""
+        sketches: dict[int, HyperLogLog] = defaultdict(HyperLogLog)
+        for url_id, registers in self.filter(url_id__in=url_ids).values_list("url_id", "registers"):
+            sketches[url_id].merge(HyperLogLog(bytes(registers)))
+        return dict(sketches)
+
+
+class UrlSketch(models.Model):
+    """
+    HyperLogLog sketch of user sessions which visited the url during the day, see `fingerprint.hll`.
+
+    A sketch of all time (with `day` set to None) is kept next to daily ones, so that counts without a window
+    read a single sketch instead of merging the whole history of the url.
+    """
+
+    url = models.ForeignKey(Url, on_delete=models.CASCADE, related_name="sketches")
+    day = models.DateField(null=True, blank=True)
+    registers = models.BinaryField()
+
+    objects = UrlSketchQuerySet.as_manager()
+
+    class Meta:  # noqa: D106
+        constraints = [
+            models.UniqueConstraint(fields=["url", "day"], name="unique_url_sketch_day"),
+            models.UniqueConstraint(fields=["url"], condition=Q(day=None), name="unique_url_sketch_all_time"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.url_id} {self.day}"
+
+
+def add_to_sketches(fingerprints: Iterable[RequestFingerprint]) -> None:
+    """Add sessions of request fingerprints to sketches of their urls, if enabled by `FINGERPRINT_SKETCHES`."""
+    if not (backend := get_sketch_backend()):
+        return
+
+    sketches: dict[date, dict[int, HyperLogLog]] = defaultdict(lambda: defaultdict(HyperLogLog))
+    for fingerprint in fingerprints:
+        sketches[fingerprint.created.date()][fingerprint.url_id].add(fingerprint.user_session_id)
+
+    url_sketches: dict[int, HyperLogLog] = defaultdict(HyperLogLog)
+    for day_sketches in sketches.values():
+        for url_id, sketch in day_sketches.items():
+            url_sketches[url_id].merge(sketch)
+
+    if backend == "database":
+        for day, day_sketches in sketches.items():
+            UrlSketch.objects.add(day_sketches, day)
+        UrlSketch.objects.add(url_sketches, day=None)
+        return
+
+    # cache keeps only a sketch per url for all time; since cache has no compare-and-swap,
+    # concurrent updates may be lost, which makes counts slightly underestimated
+
+    cache = get_sketch_cache()
+    keys = {make_key("sketch", str(url_id)): url_id for url_id in url_sketches}
+    stored = cache.get_many(keys)
+    changed = {}
+    for key, url_id in keys.items():
+        merged = url_sketches[url_id]
+        if (registers := stored.get(key)) is not None:
+            merged.merge(HyperLogLog(registers))
+        if bytes(merged) != registers:
+            changed[key] = bytes(merged)
+    cache.set_many(changed, timeout=getattr(settings, "FINGERPRINT_SKETCH_CACHE_TIMEOUT", None))
+    invalidate_hit_counts([keys[key] for key in changed], approximate=True)
+
+
+def get_sketches(
+    url_ids: set[int], since: datetime | None = None, until: datetime | None = None
+) -> dict[int, HyperLogLog]:
+    """Sketches of sessions which visited the urls (during days within the window, if given), by url id."""
+    backend = get_sketch_backend()
+    if backend == "database":
+        if since is None and until is None:
+            return UrlSketch.objects.filter(day=None).get_sketches(url_ids)
+
+        sketches = UrlSketch.objects.all()
+        if since is not None:
+            sketches = sketches.filter(day__gte=since.astimezone(timezone.utc).date())
+        if until is not None:
+            until = until.astimezone(timezone.utc)
+            if until.time() == time.min:
+                sketches = sketches.filter(day__lt=until.date())
+            else:
+                sketches = sketches.filter(day__lte=until.date())
+        return sketches.get_sketches(url_ids)
+    if since is not None or until is not None:
+        raise ImproperlyConfigured('Approximate counts within a window require FINGERPRINT_SKETCHES = "database"')
+    if backend == "cache":
+        keys = {make_key("sketch", str(url_id)): url_id for url_id in url_ids}
+        return {keys[key]: HyperLogLog(registers) for key, registers in get_sketch_cache().get_many(keys).items()}
+    raise ImproperlyConfigured("Approximate counts require FINGERPRINT_SKETCHES setting")
+
+
+@receiver(post_save, sender=RequestFingerprint)
+def sketch_url_hit(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_to_sketches([instance])
+
+
+ROLLUP_PERIODS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def get_rollup_period() -> str:
+    """Length of `UrlHitRollup` buckets: "day" (default) or "hour"."""
+    period = getattr(settings, "FINGERPRINT_ROLLUP_PERIOD", "day")
+    if period not in ROLLUP_PERIODS:
+        raise ImproperlyConfigured(f"Invalid FINGERPRINT_ROLLUP_PERIOD value: {period!r}")
+    return period
+
+
+def get_bucket_start(moment: datetime) -> datetime:
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    length = ROLLUP_PERIODS[get_rollup_period()]
+    return epoch + (moment - epoch) // length * length
+
+
+class UrlHitRollupQuerySet(models.QuerySet):
+    def in_window(self, since: datetime | None, until: datetime | None) -> UrlHitRollupQuerySet:
+        """Buckets which start within [since, until), where `since` is moved to the start of its bucket."""
+        rollups = self
+        if since is not None:
+            rollups = rollups.filter(bucket__gte=get_bucket_start(since))
+        if until is not None:
+            rollups = rollups.filter(bucket__lt=until)
+        return rollups
+
+    def get_counts(self, url_ids: Iterable[int]) -> dict[int, int]:
+        """Sum of unique sessions of all buckets by url id."""
+        return dict(
+            self.filter(url_id__in=url_ids)
+            .values("url_id")
+            .annotate(total=Sum("hits"))
+            .order_by()
+            .values_list("url_id", "total")
+        )
+
+    async def aget_counts(self, url_ids: Iterable[int]) -> dict[int, int]:
+        """Async version of `get_counts()`."""
+        counts = (
+            self.filter(url_id__in=url_ids)
+            .values("url_id")
+            .annotate(total=Sum("hits"))
+            .order_by()
+            .values_list("url_id", "total")
+        )
+        return {url_id: total async for url_id, total in counts}
+
+    def rollup(self, since: datetime, until: datetime, batch_size: int = 1000) -> int:
+        """Recount buckets which start within [since, until) from request fingerprints, return number of rows."""
+        since = get_bucket_start(since)
+        counts = (
+            RequestFingerprint.objects.filter(created__gte=since, created__lt=until)
+            .annotate(bucket=Trunc("created", get_rollup_period(), tzinfo=timezone.utc))
+            .values("url", "bucket")
+            .annotate(hits=Count("user_session", distinct=True))
+            .order_by()
+            .values_list("url", "bucket", "hits")
+            .iterator(chunk_size=batch_size)
+        )
+
+        num_rows = 0
+        with transaction.atomic():
+            self.filter(bucket__gte=since, bucket__lt=until).delete()
+            while batch := list(islice(counts, batch_size)):
+                self.bulk_create(
+                    [self.model(url_id=url_id, bucket=bucket, hits=hits) for url_id, bucket, hits in batch]
+                )
+                num_rows += len(batch)
+        return num_rows
+
+    def build(self, until: datetime | None = None, rebuild: bool = False, chunk: timedelta = timedelta(days=1)) -> int:
+        """
+        Roll up request fingerprints created since the last (possibly incomplete) bucket until `until`.
+
+        By default, fingerprints are rolled up until the end of the current bucket.
+
+        With `rebuild=True`, all buckets are recounted from the first fingerprint. Fingerprints are processed
+        in chunks of `chunk` length, each in its own transaction. Returns the number of written rows.
+        """
+        until = until or get_bucket_start(now()) + ROLLUP_PERIODS[get_rollup_period()]
+        if rebuild:
+            self.all().delete()
+
+        if (start := self.aggregate(last=Max("bucket"))["last"]) is None:
+            if (start := RequestFingerprint.objects.aggregate(first=Min("created"))["first"]) is None:
+                return 0
+
+        start = get_bucket_start(start)
+        num_rows = 0
+        while start < until:
+            end = min(start + chunk, until)
+            num_rows += self.rollup(start, end)
+            start = end
+        return num_rows
+
+
+class UrlHitRollup(models.Model):
+    """
+    Number of unique sessions which visited the url during a time bucket (see `FINGERPRINT_ROLLUP_PERIOD`).
+
+    Rollups are built incrementally by `manage.py rollup_url_hits`, which should be run periodically.
+    """
+
+    url = models.ForeignKey(Url, on_delete=models.CASCADE, related_name="rollups")
+    bucket = models.DateTimeField()
+    hits = models.PositiveIntegerField()
+
+    objects = UrlHitRollupQuerySet.as_manager()
+
+    class Meta:  # noqa: D106
+        constraints = [
+            models.UniqueConstraint(fields=["url", "bucket"], name="unique_url_hit_rollup_bucket"),
+        ]
+        indexes = [
+            models.Index(fields=["bucket"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.url_id} {self.bucket}: {self.hits}"
+
+
+class UserDevice(models.Model):
+    """
+    Device of a user, i.e. a distinct `DEVICE_FIELDS` value of fingerprints of the user's sessions.
+
+    Devices are unique per user, so that `UserFingerprintStats` tell new devices apart from known ones
+    by inserting them, and count them without scanning fingerprints.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    # model name of the fingerprints, e.g. "browserfingerprint"
+    kind = models.CharField(max_length=32)
+    device_hash = models.BigIntegerField()
+
+    class Meta:  # noqa: D106
+        constraints = [
+            models.UniqueConstraint(fields=["user", "device_hash"], name="unique_user_device"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.kind} {self.device_hash}"
+
+
+class UserFingerprintStatsQuerySet(models.QuerySet):
+    @staticmethod
+    def _count_devices(model: type[AbstractFingerprint]) -> Expression:
+        return Coalesce(
+            Subquery(
+                UserDevice.objects.filter(user=OuterRef("user"), kind=model._meta.model_name)
+                .order_by()
+                .values("user")
+                .annotate(devices=Count("*"))
+                .values("devices")
+            ),
+            0,
+        )
+
+    def add(self, fingerprints: Iterable[AbstractFingerprint]) -> None:
+        """
+        Account new (already stored) fingerprints in stats of their users, creating missing stats.
+
+        Users of sessions are looked up, unless they are already known from `_session_user_id` of fingerprints,
+        which is set when the session was loaded along with storing the fingerprint.
+        """
+        fingerprints = list(fingerprints)
+        user_ids = {
+            fingerprint.user_session_id: fingerprint._session_user_id
+            for fingerprint in fingerprints
+            if hasattr(fingerprint, "_session_user_id")
+        }
+        if missing := {fingerprint.user_session_id for fingerprint in fingerprints} - user_ids.keys():
+            user_ids.update(UserSession.objects.get_user_ids(missing))
+        if not any(user_ids.values()):
+            return
+
+        devices: dict[tuple[int, int], str] = {}
+        last_seen: dict[int, datetime] = {}
+        for fingerprint in fingerprints:
+            if (user_id := user_ids.get(fingerprint.user_session_id)) is None:
+                continue
+            devices[user_id, fingerprint.get_device_hash(fingerprint.get_device())] = fingerprint._meta.model_name
+            last_seen[user_id] = max(last_seen.get(user_id, fingerprint.created), fingerprint.created)
+
+        known = UserDevice.objects.filter(
+            user__in=last_seen.keys(), device_hash__in={device_hash for _, device_hash in devices}
+        ).values_list("user_id", "device_hash")
+        if new_devices := devices.keys() - set(known):
+            # other processes may be adding the same devices, so stats are recounted rather than incremented
+            UserDevice.objects.bulk_create(
+                [
+                    UserDevice(user_id=user_id, kind=devices[user_id, device_hash], device_hash=device_hash)
+                    for user_id, device_hash in new_devices
+                ],
+                ignore_conflicts=True,
+            )
+            new_users = {user_id for user_id, _ in new_devices}
+            self.bulk_create([self.model(user_id=user_id) for user_id in new_users], ignore_conflicts=True)
+            for user_id in new_users:
+                seen = last_seen.pop(user_id)
+                self.filter(user_id=user_id).update(
+                    last_seen=Greatest(Coalesce("last_seen", seen), seen),
+                    **{
+                        model.STATS_FIELD: self._count_devices(model)
+                        for model in (BrowserFingerprint, RequestFingerprint)
+                    },
+                )
+        # users seen on known devices only
+        update_last_seen(self, last_seen)
+
+    def refresh(self, user_ids: Iterable[int]) -> None:
+        """Recount devices and stats of users from all their fingerprints."""
+        stats = {user_id: self.model(user_id=user_id) for user_id in user_ids}
+        user_devices = []
+        for model in (BrowserFingerprint, RequestFingerprint):
+            devices = (
+                model.objects.filter(user_session__user__in=stats.keys())
+                .values("user_session__user", *model.DEVICE_FIELDS)
+                .annotate(last_seen=Max("created"))
+                .order_by()
+                .values_list("user_session__user", "last_seen", *model.DEVICE_FIELDS)
+            )
+            for user_id, last_seen, *device in devices:
+                user_devices.append(
+                    UserDevice(
+                        user_id=user_id, kind=model._meta.model_name, device_hash=model.get_device_hash(tuple(device))
+                    )
+                )
+                user_stats = stats[user_id]
+                setattr(user_stats, model.STATS_FIELD, getattr(user_stats, model.STATS_FIELD) + 1)
+                user_stats.last_seen = max(filter(None, (user_stats.last_seen, last_seen)))
+
+        with transaction.atomic():
+            UserDevice.objects.filter(user__in=stats.keys()).delete()
+            UserDevice.objects.bulk_create(user_devices)
+            self.filter(user_id__in=stats.keys()).delete()
+            self.bulk_create(stats.values())
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """Recount devices and stats of all users who have sessions, and return the number of users."""
+        user_ids = (
+            UserSession.objects.exclude(user=None)
+            .values_list("user_id", flat=True)
+            .distinct()
+            .order_by("user_id")
+            .iterator(chunk_size=batch_size)
+        )
+
+        num_users = 0
+        UserDevice.objects.all().delete()
+        self.all().delete()
+        for batch in batched(user_ids, batch_size):
+            self.refresh(batch)
+            num_users += len(batch)
+        return num_users
+
+
+class UserFingerprintStats(models.Model):
+    """
+    Summary of fingerprints of a user, maintained as fingerprints are stored, so that admin doesn't aggregate them.
+
+    Devices are distinct visitor ids of browser fingerprints and distinct user agents of request fingerprints,
+    which are kept as `UserDevice` objects.
+    Stats of a user are recounted when a session is assigned to the user (e.g. on login), but deleting fingerprints
+    doesn't update them; run `manage.py rebuild_user_fingerprint_stats` to recount all users.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True, on_delete=models.CASCADE, related_name="fingerprint_stats"
+    )
+    num_browser_fingerprints = models.PositiveIntegerField(default=0)
+    num_request_fingerprints = models.PositiveIntegerField(default=0)
+    last_seen = models.DateTimeField(blank=True, null=True)
+
+    objects = UserFingerprintStatsQuerySet.as_manager()
+
+    class Meta:  # noqa: D106
+        verbose_name_plural = "user fingerprint stats"
+        indexes = [
+            models.Index(fields=["num_browser_fingerprints"]),
+            models.Index(fields=["num_request_fingerprints"]),
+            models.Index(fields=["-last_seen"]),
+        ]
+
+    def __str__(self) -> str:
+        return str(self.user_id)
+
+
+def add_to_last_seen(fingerprints: Iterable[AbstractFingerprint]) -> None:
+    """Update `last_seen` of user sessions and stats of their users by new fingerprints."""
+    fingerprints = list(fingerprints)
+    last_seen: dict[int, datetime] = {}
+    for fingerprint in fingerprints:
+        last_seen[fingerprint.user_session_id] = max(
+            last_seen.get(fingerprint.user_session_id, fingerprint.created), fingerprint.created
+        )
+    update_last_seen(UserSession.objects.all(), last_seen)
+    UserFingerprintStats.objects.add(fingerprints)
+
+
+@receiver(post_save, sender=BrowserFingerprint)
+@receiver(post_save, sender=RequestFingerprint)
+def add_to_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_to_last_seen([instance])
+
+
+@receiver(post_save, sender=UserSession)
+def refresh_user_stats(sender, instance, created, raw=False, **kwargs):
+    # fingerprints of a session captured before the session was assigned to the user are counted now
+    if created or raw or instance.user_id == getattr(instance, "_loaded_user_id", None):
+        return
+    instance._loaded_user_id = instance.user_id
+    if instance.user_id is not None:
+        UserFingerprintStats.objects.refresh([instance.user_id])
 
 
 class UserFingerprint(get_user_model()):  # type: ignore
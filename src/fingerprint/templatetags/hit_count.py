@@ -1,10 +1,90 @@
+from __future__ import annotations
+
+import re
+import secrets
+from collections.abc import Iterable
+
 from django import template
 
 from ..models import RequestFingerprint
 
 register = template.Library()
 
+# leading underscore makes the variables inaccessible from templates
+HIT_COUNTS_BATCH = "_hit_counts_batch"
+PREFETCHED_HIT_COUNTS = "_prefetched_hit_counts"
+
+
+async def aprefetch_hit_counts(urls: Iterable[str]) -> dict[str, dict[str, int]]:
+    """
+    Fetch hit counts of urls ahead of rendering, and return them as an extra template context.
+
+    Templates are rendered synchronously, so `hit_count` tags cannot query the database in async views;
+    instead, they use counts prefetched by this function, e.g. concurrently with other queries of the view.
+    """
+    urls = set(urls)
+    counts = await RequestFingerprint.aget_count_for_urls(urls)
+    return {PREFETCHED_HIT_COUNTS: {url: counts[url] for url in urls}}
+
+
+def get_counts(context, urls: set[str]) -> dict[str, int]:
+    """Hit counts of urls, prefetched by `aprefetch_hit_counts()` or queried otherwise."""
+    counts = {url: count for url, count in context.get(PREFETCHED_HIT_COUNTS, {}).items() if url in urls}
+    if missing := urls - counts.keys():
+        counts.update(RequestFingerprint.get_count_for_urls(missing))
+    return counts
+
+
+class HitCountsBatch:
+    """Urls of `hit_count` tags rendered inside `hit_counts` block, replaced by placeholders until resolved."""
+
+    def __init__(self, context):
+        self.context = context
+        self.token = secrets.token_hex(8)
+        self.urls: list[str] = []
+
+    def add(self, url: str) -> str:
+        self.urls.append(url)
+        return f"[hit_count:{self.token}:{len(self.urls) - 1}]"
+
+    def resolve(self, rendered: str) -> str:
+        if not self.urls:
+            return rendered
+
+        counts = get_counts(self.context, set(self.urls))
+        return re.sub(
+            rf"\[hit_count:{self.token}:(\d+)\]",
+            lambda match: str(counts.get(self.urls[int(match[1])], 0)),
+            rendered,
+        )
+
+
+class HitCountsNode(template.Node):
+    def __init__(self, nodelist: template.NodeList):
+        self.nodelist = nodelist
+
+    def render(self, context) -> str:
+        batch = HitCountsBatch(context)
+        with context.push({HIT_COUNTS_BATCH: batch}):
+            rendered = self.nodelist.render(context)
+        return batch.resolve(rendered)
+
+
+@register.tag
+def hit_counts(parser, token):
+    """
+    Resolve all `hit_count` tags inside the block (including included templates) at once.
+
+    Inside the block, `hit_count` renders a placeholder which is replaced by the count after the whole
+    block is rendered, so its value cannot be used in filters or conditions.
+    """
+    nodelist = parser.parse(("endhit_counts",))
+    parser.delete_first_token()
+    return HitCountsNode(nodelist)
+
 
-@register.simple_tag
-def hit_count(url: str) -> int:
-    return RequestFingerprint.get_count_for_urls([url])[url]
+@register.simple_tag(takes_context=True)
+def hit_count(context, url: str) -> int | str:
+    if (batch := context.get(HIT_COUNTS_BATCH)) is not None:
+        return batch.add(url)
+    return get_counts(context, {url}).get(url, 0)
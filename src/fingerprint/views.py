@@ -1,13 +1,17 @@
-from contextlib import suppress
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
 from datetime import timedelta
 from functools import wraps
 from logging import getLogger
-from typing import Optional
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.conf import settings
+from django.contrib.auth import get_user
 from django.core.exceptions import BadRequest, DisallowedRedirect
 from django.db import transaction
-from django.http.response import HttpResponse
+from django.http import HttpRequest
+from django.http.response import HttpResponse, HttpResponseBase
 from django.utils.datastructures import MultiValueDictKeyError
 from django.utils.decorators import method_decorator
 from django.utils.encoding import iri_to_uri
@@ -17,7 +21,16 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 from ipware import get_client_ip
 
-from .models import BrowserFingerprint, RequestFingerprint, Url, UserSession
+from .canonical import canonicalize
+from .capture import (
+    RequestFingerprintEntry,
+    ais_debounced,
+    astore_request_fingerprint,
+    is_debounced,
+    store_after_response,
+    store_request_fingerprint,
+)
+from .models import BrowserFingerprint, Url, UserSession
 
 log = getLogger(__name__)
 
@@ -36,43 +49,140 @@ def get_or_create_session_key(request) -> str:
     return request.session.session_key
 
 
+async def aget_or_create_session_key(request) -> str:
+    if not request.session or not request.session.session_key:
+        await sync_to_async(request.session.create)()
+    return request.session.session_key
+
+
+async def aget_user(request):
+    if hasattr(request, "auser"):  # django>=5.0
+        return await request.auser()
+    return await sync_to_async(get_user)(request)
+
+
+def get_session_defaults(request) -> dict:
+    session_defaults = {param: request.GET.get(param, "") for param in UTM_PARAMS}
+    session_defaults["referer"] = request.META.get("HTTP_REFERER", "")
+    return session_defaults
+
+
+def get_fingerprint_defaults(request) -> dict:
+    return dict(
+        ip=get_client_ip(request)[0],
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        accept=request.META.get("HTTP_ACCEPT", ""),
+        content_encoding=request.META.get("HTTP_CONTENT_ENCODING", ""),
+        content_language=request.META.get("HTTP_CONTENT_LANGUAGE", ""),
+        referer=request.META.get("HTTP_REFERER", ""),
+        cf_ipcountry=request.META.get("HTTP_CF_IPCOUNTRY", ""),
+    )
+
+
+def get_request_fingerprint_entry(request, session_key: str) -> RequestFingerprintEntry:
+    return RequestFingerprintEntry(
+        session_key=session_key,
+        url=canonicalize(request.build_absolute_uri()),
+        session_defaults=get_session_defaults(request),
+        fingerprint_defaults=get_fingerprint_defaults(request),
+        captured=now(),
+    )
+
+
+def capture_request_fingerprint(request) -> RequestFingerprintEntry | None:
+    """Capture everything needed to store the fingerprint of the request, unless it is debounced."""
+    entry = get_request_fingerprint_entry(request, get_or_create_session_key(request))
+    if is_debounced(entry.session_key, entry.url):
+        return None
+    return entry
+
+
+async def acapture_request_fingerprint(request) -> RequestFingerprintEntry | None:
+    """Async version of `capture_request_fingerprint()`."""
+    entry = get_request_fingerprint_entry(request, await aget_or_create_session_key(request))
+    if await ais_debounced(entry.session_key, entry.url):
+        return None
+    return entry
+
+
+def is_deferred() -> bool:
+    return getattr(settings, "FINGERPRINT_DEFERRED", False)
+
+
+def fingerprint_request(request, get_response: Callable[[HttpRequest], HttpResponseBase]) -> HttpResponseBase:
+    """
+    Fingerprint the request and return the response produced by `get_response`.
+
+    With `FINGERPRINT_DEFERRED = True`, the fingerprint is captured before `get_response` is called,
+    but it is stored only after the response has been sent to the client.
+    """
+    entry = capture_request_fingerprint(request)
+    if entry is not None and not is_deferred():
+        store_request_fingerprint(entry)
+
+    response = get_response(request)
+
+    if entry is not None and is_deferred():
+        store_after_response(response, entry)
+    return response
+
+
+async def afingerprint_request(
+    request, get_response: Callable[[HttpRequest], Awaitable[HttpResponseBase]]
+) -> HttpResponseBase:
+    """Async version of `fingerprint_request()`."""
+    entry = await acapture_request_fingerprint(request)
+    if entry is not None and not is_deferred():
+        await astore_request_fingerprint(entry)
+
+    response = await get_response(request)
+
+    if entry is not None and is_deferred():
+        store_after_response(response, entry)
+    return response
+
+
 def fingerprint(fn):
-    """A decorator which creates a backend Fingerprint object for the current request."""
+    """
+    A decorator which creates a backend Fingerprint object for the current request.
+
+    Both regular and `async def` views are supported; the latter use django async ORM.
+    """
+
+    if iscoroutinefunction(fn):
+
+        @wraps(fn)
+        async def async_wrapper(request, *args, **kwargs):
+            return await afingerprint_request(request, lambda request: fn(request, *args, **kwargs))
+
+        return async_wrapper
 
     @wraps(fn)
     def wrapper(request, *args, **kwargs):
-        session_key = get_or_create_session_key(request)
-        debounce_period = getattr(settings, "FINGERPRINT_DEBOUNCE_PERIOD", timedelta(seconds=10))
-
-        url_value = request.build_absolute_uri()
-        url, _ = Url.objects.get_get_or_create(value=url_value)
-
-        referer = request.META.get("HTTP_REFERER", "")
-
-        session_defaults = {param: request.GET.get(param, "") for param in UTM_PARAMS}
-        session_defaults["referer"] = referer
-
-        with suppress(RequestFingerprint.MultipleObjectsReturned), transaction.atomic():
-            fingerprint, created = RequestFingerprint.objects.get_or_create(
-                user_session=UserSession.objects.get_or_create(session_key=session_key, defaults=session_defaults)[0],
-                url=url,
-                created__gte=now() - debounce_period,
-                defaults=dict(
-                    ip=get_client_ip(request)[0],
-                    user_agent=request.META.get("HTTP_USER_AGENT", ""),
-                    accept=request.META.get("HTTP_ACCEPT", ""),
-                    content_encoding=request.META.get("HTTP_CONTENT_ENCODING", ""),
-                    content_language=request.META.get("HTTP_CONTENT_LANGUAGE", ""),
-                    referer=referer,
-                    cf_ipcountry=request.META.get("HTTP_CF_IPCOUNTRY", ""),
-                ),
-            )
-            log.debug("Fingerprint %s, created=%s", fingerprint, created)
-        return fn(request, *args, **kwargs)
+        return fingerprint_request(request, lambda request: fn(request, *args, **kwargs))
 
     return wrapper
 
 
+def remember_user(request) -> None:
+    """Assign the session of the request to its user, if the user is logged in."""
+    if request.user.is_authenticated:
+        UserSession.objects.update_or_create(
+            session_key=get_or_create_session_key(request),
+            defaults=dict(user=request.user),
+        )
+
+
+async def aremember_user(request) -> None:
+    """Async version of `remember_user()`."""
+    user = await aget_user(request)
+    if user.is_authenticated:
+        await UserSession.objects.aupdate_or_create(
+            session_key=await aget_or_create_session_key(request),
+            defaults=dict(user=user),
+        )
+
+
 def remember_user_session(fn):
     """
     A decorator to match a user to a session.
@@ -83,13 +193,18 @@ def remember_user_session(fn):
     remembers UserSession if user is logged in.
     """
 
+    if iscoroutinefunction(fn):
+
+        @wraps(fn)
+        async def async_wrapper(request, *args, **kwargs):
+            await aremember_user(request)
+            return await fn(request, *args, **kwargs)
+
+        return async_wrapper
+
     @wraps(fn)
     def wrapper(request, *args, **kwargs):
-        if request.user.is_authenticated:
-            UserSession.objects.update_or_create(
-                session_key=get_or_create_session_key(request),
-                defaults=dict(user=request.user),
-            )
+        remember_user(request)
         return fn(request, *args, **kwargs)
 
     return wrapper
@@ -120,7 +235,7 @@ class FingerprintView(TemplateView):
 
     template_name = "fingerprint/fingerprint.html"
     redirect_in = timedelta(seconds=3)
-    allowed_hosts: Optional[set] = None
+    allowed_hosts: set | None = None
 
     def get_context_data(self, **kwargs):
         redirect_url = iri_to_uri(self.request.GET.get("next", "/"))
@@ -132,21 +247,54 @@ class FingerprintView(TemplateView):
             "redirect_url": redirect_url,
         }
 
-    def post(self, request, *args, **kwargs):
+    def get_visitor_id(self) -> str:
         try:
-            visitor_id = request.POST["id"]
+            return self.request.POST["id"]
         except MultiValueDictKeyError:
             raise BadRequest()
 
+    def post(self, request, *args, **kwargs):
+        visitor_id = self.get_visitor_id()
+
         session_key = get_or_create_session_key(request)
 
-        url_value = request.META.get("HTTP_REFERER", "")
-        url, _ = Url.objects.get_get_or_create(value=url_value)
+        url_id = Url.objects.get_or_create_id(canonicalize(request.META.get("HTTP_REFERER", "")))
 
         with transaction.atomic():
             BrowserFingerprint.objects.create(
-                user_session=UserSession.objects.get_or_create(session_key=session_key)[0],
-                url=url,
+                user_session_id=UserSession.objects.get_or_create_id(session_key),
+                url_id=url_id,
                 visitor_id=visitor_id,
             )
         return HttpResponse(status=200)
+
+
+class AsyncFingerprintView(FingerprintView):
+    """
+    `FingerprintView` for ASGI deployments, which doesn't block a thread on database queries.
+
+    Its `get()` remembers the user session and fingerprints the request itself, rather than being decorated
+    like `FingerprintView.get()`, since `method_decorator` supports async methods only since django 5.0.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        await aremember_user(request)
+
+        async def get_response(request):
+            return TemplateView.get(self, request, *args, **kwargs)
+
+        return await afingerprint_request(request, get_response)
+
+    async def post(self, request, *args, **kwargs):
+        visitor_id = self.get_visitor_id()
+
+        session_key = await aget_or_create_session_key(request)
+
+        url_id = await Url.objects.aget_or_create_id(canonicalize(request.META.get("HTTP_REFERER", "")))
+
+        await BrowserFingerprint.objects.acreate(
+            user_session_id=await UserSession.objects.aget_or_create_id(session_key),
+            url_id=url_id,
+            visitor_id=visitor_id,
+        )
+        return HttpResponse(status=200)